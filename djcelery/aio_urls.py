@@ -0,0 +1,74 @@
+"""
+
+URLs defined for celery, using the async views of
+:mod:`djcelery.aio_views`.  Include these instead of :mod:`djcelery.urls`
+when serving with ASGI.
+
+* ``/$task_id/done/``
+
+    URL to :func:`~djcelery.aio_views.is_task_successful`.
+
+* ``/$task_id/status/``
+
+    URL  to :func:`~djcelery.aio_views.task_status`.
+
+* ``/$task_id/wait/?timeout=$seconds``
+
+    URL to :func:`~djcelery.aio_views.task_wait`.
+
+* ``/status/?id=$task_id&id=...``
+
+    URL to :func:`~djcelery.aio_views.tasks_status`.
+
+* ``/events/?id=$task_id&id=...&timeout=$seconds``
+
+    URL to :func:`~djcelery.aio_views.tasks_events`, only defined
+    with Django 4.2+, which is the first version streaming async
+    responses.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+try:
+    from django.urls import re_path as url
+except ImportError:  # Django < 2.0
+    from django.conf.urls import url
+
+
+from . import aio_views
+from .urls import task_pattern
+
+urlpatterns = [
+    url(
+        r'^%s/done/?$' % task_pattern,
+        aio_views.is_task_successful,
+        name='celery-is_task_successful'
+    ),
+    url(
+        r'^%s/status/?$' % task_pattern,
+        aio_views.task_status,
+        name='celery-task_status'
+    ),
+    url(
+        r'^%s/wait/?$' % task_pattern,
+        aio_views.task_wait,
+        name='celery-task_wait'
+    ),
+    url(
+        r'^status/?$',
+        aio_views.tasks_status,
+        name='celery-tasks_status'
+    ),
+    url(
+        r'^tasks/?$',
+        aio_views.registered_tasks,
+        name='celery-tasks'
+    ),
+]
+
+if aio_views.STREAMS_ASYNC:
+    urlpatterns.append(url(
+        r'^events/?$',
+        aio_views.tasks_events,
+        name='celery-tasks_events'
+    ))
@@ -0,0 +1,142 @@
+"""Async versions of the views in :mod:`djcelery.views`, for ASGI.
+
+Requires Python 3.6+ and Django 3.1+.  Database queries are run using
+:func:`asgiref.sync.sync_to_async`, see :mod:`djcelery.aio_urls`.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+
+import django
+
+from asgiref.sync import sync_to_async
+
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+
+from celery import states
+from celery.exceptions import TimeoutError
+from celery.five import items, monotonic
+from celery.result import AsyncResult
+
+from .views import (
+    TASK_WATCH_INTERVAL, JsonResponse, conditional_json_response,
+    registered_tasks, task_event, task_status_data, task_successful_data,
+    task_wait_timeout, tasks_status_data, tasks_status_ids, wait_for_tasks,
+)
+
+__all__ = ['is_task_successful', 'task_status', 'task_wait',
+           'tasks_status', 'registered_tasks']
+
+#: Django only streams asynchronous iterators starting with 4.2, so
+#: :func:`tasks_events` is not defined before.
+STREAMS_ASYNC = django.VERSION >= (4, 2)
+
+
+async def is_task_successful(request, task_id):
+    """Returns task execute status in JSON format."""
+    backend = AsyncResult(task_id).backend
+    aget_state = getattr(backend, 'aget_state', None)
+    if aget_state is not None:
+        state = await aget_state(task_id)
+    else:
+        state = await sync_to_async(backend.get_state)(task_id)
+    return JsonResponse(task_successful_data(task_id, state))
+
+
+async def task_status(request, task_id):
+    """Returns task status and result in JSON format."""
+    return JsonResponse(await sync_to_async(task_status_data)(task_id))
+
+
+async def task_wait(request, task_id):
+    """Long-polling version of :func:`task_status`, see
+    :func:`djcelery.views.task_wait`.
+
+    No thread is held while waiting if the result backend has
+    an ``async_wait_for`` method.
+
+    """
+    try:
+        timeout = task_wait_timeout(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    backend = AsyncResult(task_id).backend
+    async_wait_for = getattr(backend, 'async_wait_for', None)
+    if async_wait_for is None:
+        await sync_to_async(wait_for_tasks)([task_id], timeout)
+    elif timeout:
+        try:
+            await async_wait_for(task_id, timeout=timeout,
+                                 interval=TASK_WATCH_INTERVAL)
+        except TimeoutError:
+            pass
+    return await task_status(request, task_id)
+
+
+async def tasks_status(request):
+    """Returns the status of many tasks as a JSON object mapping
+    task ids to states, see :func:`djcelery.views.tasks_status`."""
+    try:
+        task_ids = tasks_status_ids(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    data = await sync_to_async(tasks_status_data)(task_ids)
+    return conditional_json_response(request, data)
+
+
+# csrf_exempt() does not support coroutine functions before Django 5.0.
+tasks_status.csrf_exempt = True
+
+
+if STREAMS_ASYNC:
+    __all__.append('tasks_events')
+
+    async def tasks_events(request):
+        """Stream the states of many tasks as server-sent events, see
+        :func:`djcelery.views.tasks_events`."""
+        try:
+            task_ids = tasks_status_ids(request)
+            timeout = task_wait_timeout(request)
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+        response = StreamingHttpResponse(
+            tasks_events_stream(task_ids, timeout),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # don't let nginx buffer events.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    tasks_events.csrf_exempt = True
+
+
+async def tasks_events_stream(task_ids, timeout):
+    async for change in watch_tasks(task_ids, timeout):
+        yield task_event(change)
+    yield 'event: end\ndata: {}\n\n'
+
+
+async def watch_tasks(task_ids, timeout, interval=TASK_WATCH_INTERVAL):
+    """Async version of :func:`djcelery.views.watch_tasks`, polling
+    the states every ``interval`` seconds without holding a thread
+    in between."""
+    remaining, seen = set(task_ids), {}
+    deadline = monotonic() + timeout
+    while remaining:
+        changed = False
+        data = await sync_to_async(tasks_status_data)(list(remaining))
+        for task_id, state in items(data):
+            if seen.get(task_id) != state:
+                seen[task_id] = state
+                changed = True
+                yield task_id, state
+            if state in states.READY_STATES:
+                remaining.discard(task_id)
+        left = deadline - monotonic()
+        if not remaining or left <= 0:
+            break
+        if not changed:
+            yield None
+        await asyncio.sleep(min(interval, left))
@@ -0,0 +1,177 @@
+"""asyncio support for the database backend.
+
+Requires Python 3.5+ and :mod:`asgiref` (installed with Django 3.0+).
+Database queries are run using :func:`asgiref.sync.sync_to_async`, while
+waiting between them never blocks a thread.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import weakref
+
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from celery import states
+from celery.exceptions import TimeoutError
+from celery.five import monotonic
+from celery.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+#: Dispatchers by event loop, and by notifier within a loop.
+_dispatchers = weakref.WeakKeyDictionary()
+
+
+class NotificationDispatcher(object):
+    """Receives the notifications of ``notifier`` using a single
+    process-wide listener, and wakes up the coroutines waiting for the
+    notified tasks.
+
+    The listener has its own connection, see
+    :meth:`~djcelery.backends.notify.PostgresNotifier.listener`, so it
+    is never shared with queries, and is read by the event loop
+    whenever notifications arrive.
+
+    """
+
+    def __init__(self, notifier, loop):
+        self.notifier = notifier
+        self.loop = loop
+        self.listener = None
+        self.closed = False
+        self.waiters = defaultdict(set)
+        self._starting = None
+
+    async def start(self):
+        if self._starting is None:
+            self._starting = self.loop.create_task(self._start())
+        try:
+            await asyncio.shield(self._starting)
+        except Exception:
+            # the next wait tries again with a new dispatcher.
+            self.closed = True
+            raise
+
+    async def _start(self):
+        listener = await sync_to_async(self.notifier.listener)(shared=True)
+        await sync_to_async(listener.__enter__)()
+        self.listener = listener
+        self.loop.add_reader(listener.fileno(), self._on_readable)
+
+    def wait(self, task_id):
+        """Return a future set when ``task_id`` is notified,
+        to be discarded using :meth:`discard`."""
+        future = self.loop.create_future()
+        self.waiters[task_id].add(future)
+        return future
+
+    def discard(self, task_id, future):
+        futures = self.waiters.get(task_id)
+        if futures is not None:
+            futures.discard(future)
+            if not futures:
+                del self.waiters[task_id]
+
+    def _on_readable(self):
+        try:
+            task_ids = self.listener.receive(0)
+        except Exception as exc:
+            # waiters keep polling, and the next wait starts over.
+            logger.warning('Cannot receive result notifications: %r', exc,
+                           exc_info=True)
+            self.close()
+            return
+        for task_id in task_ids:
+            for future in self.waiters.pop(task_id, ()):
+                if not future.done():
+                    future.set_result(task_id)
+
+    def close(self):
+        self.closed = True
+        if self.listener is not None:
+            try:
+                self.loop.remove_reader(self.listener.fileno())
+            except Exception:
+                pass
+            self.listener.close()
+            self.listener = None
+
+
+async def get_dispatcher(notifier):
+    """Return the started :class:`NotificationDispatcher` of ``notifier``
+    for the running event loop."""
+    loop = asyncio.get_event_loop()
+    by_notifier = _dispatchers.setdefault(loop, {})
+    key = (type(notifier), getattr(notifier, 'channel', None),
+           getattr(notifier, 'path', None))
+    dispatcher = by_notifier.get(key)
+    if dispatcher is None or dispatcher.closed:
+        dispatcher = by_notifier[key] = NotificationDispatcher(notifier, loop)
+    await dispatcher.start()
+    return dispatcher
+
+
+class AsyncBackendMixin(object):
+    """Awaitable versions of the result accessors of
+    :class:`~djcelery.backends.database.DatabaseBackend`."""
+
+    async def aget_task_meta(self, task_id, cache=True):
+        """Awaitable :meth:`get_task_meta`."""
+        return await sync_to_async(self.get_task_meta)(task_id, cache=cache)
+
+    async def aget_state(self, task_id):
+        """Awaitable :meth:`get_state`, selecting only the status."""
+        return await sync_to_async(self.get_state)(task_id)
+    aget_status = aget_state
+
+    async def async_wait_for(self, task_id, timeout=None, interval=0.5,
+                             on_interval=None):
+        """Awaitable :meth:`wait_for`.
+
+        Wakes up as soon as the result is stored if notifications are
+        enabled, and polls the database every ``interval`` seconds
+        otherwise.  All waiters of the process share a single
+        notification listener, see :class:`NotificationDispatcher`.
+
+        """
+        dispatcher = None
+        if self.notifier is not None:
+            try:
+                dispatcher = await get_dispatcher(self.notifier)
+            except Exception as exc:
+                logger.warning('Cannot listen for result notifications: %r',
+                               exc, exc_info=True)
+            else:
+                interval = max(interval, self.notify_poll_interval)
+        started = monotonic()
+        while 1:
+            # registered before the lookup, so that results stored
+            # in the meantime are not missed.
+            future = dispatcher.wait(task_id) if dispatcher else None
+            try:
+                meta = await self.aget_task_meta(task_id)
+                if meta['status'] in states.READY_STATES:
+                    return meta
+                if on_interval:
+                    on_interval()
+                if timeout:
+                    remaining = timeout - (monotonic() - started)
+                    if remaining <= 0:
+                        raise TimeoutError('The operation timed out.')
+                    interval = min(interval, remaining)
+                if future is None:
+                    await asyncio.sleep(interval)
+                    continue
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), interval)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    if self.pending_cache is not None:
+                        self.pending_cache.discard(task_id)
+            finally:
+                if future is not None:
+                    dispatcher.discard(task_id, future)
@@ -1,21 +1,289 @@
 from __future__ import absolute_import, unicode_literals
 
+import threading
+
+from collections import OrderedDict
+from functools import partial
+from time import sleep
+
 from celery import current_app
+from celery import signals
+from celery import states
 from celery.backends.base import BaseDictBackend
+from celery.exceptions import TimeoutError
+from celery.five import items, monotonic
+from celery.utils.functional import LRUCache
+from celery.utils.log import get_logger
 
 try:
     from celery.utils.timeutils import maybe_timedelta
 except ImportError:
     from celery.utils.time import maybe_timedelta
 
+from django import db
+from django.core.cache import caches
+
 from ..models import TaskMeta, TaskSetMeta
+from ..utils import now
+from .notify import PollingListener, get_notifier
+
+try:
+    from .aio import AsyncBackendMixin
+except (ImportError, SyntaxError):  # Python 2, or asgiref not installed.
+
+    class AsyncBackendMixin(object):  # noqa
+        pass
+
+logger = get_logger(__name__)
+
+
+class ResultBuffer(object):
+    """Write-behind buffer of task results.
+
+    Pending results are written in bulk using ``write`` when
+    ``limit`` results are pending, when a background thread wakes up
+    every ``timeout`` seconds, or when :meth:`flush` is called.
+
+    Only the latest result for each task is kept.
+
+    """
+
+    def __init__(self, write, limit, timeout=1.0):
+        self.write = write
+        self.limit = limit
+        self.timeout = timeout
+        self.pending = OrderedDict()
+        self.mutex = threading.RLock()
+        self._flusher = None
+
+    def __contains__(self, task_id):
+        return task_id in self.pending
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, task_id, fields):
+        with self.mutex:
+            self.pending[task_id] = dict(fields, task_id=task_id)
+            full = len(self.pending) >= self.limit
+        if full:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def discard(self, task_id):
+        with self.mutex:
+            self.pending.pop(task_id, None)
+
+    def flush(self):
+        """Write all pending results, returns the number written."""
+        with self.mutex:
+            if not self.pending:
+                return 0
+            rows = list(self.pending.values())
+            self.pending.clear()
+            try:
+                self.write(rows)
+            except Exception:
+                # keep them for the next flush, unless a newer
+                # result for the same task arrived in the meantime.
+                for row in rows:
+                    self.pending.setdefault(row['task_id'], row)
+                raise
+            return len(rows)
+
+    def _ensure_flusher(self):
+        # The thread does not survive a fork, so this also
+        # starts a new one in pool child processes.
+        flusher = self._flusher
+        if flusher is None or not flusher.is_alive():
+            with self.mutex:
+                if self._flusher is flusher:
+                    self._flusher = threading.Thread(
+                        target=self._run, name='djcelery.ResultBuffer',
+                    )
+                    self._flusher.daemon = True
+                    self._flusher.start()
+
+    def _run(self):
+        while True:
+            sleep(self.timeout)
+            try:
+                db.close_old_connections()
+                self.flush()
+            except Exception as exc:
+                logger.error('Cannot flush buffered task results: %r',
+                             exc, exc_info=True)
+
+
+class ResultCache(object):
+    """Read-through cache of the metadata of ready tasks.
+
+    Metadata is kept in an in-process LRU cache holding at most ``limit``
+    tasks, and also in the Django cache named ``alias`` if set.  In both
+    entries expire after ``timeout`` seconds, which is also how long
+    other processes may still see a result deleted by :meth:`delete`
+    or :meth:`clear`.
+
+    """
+    key_prefix = 'djcelery-taskmeta-'
+
+    def __init__(self, limit=None, alias=None, timeout=None):
+        self.local = LRUCache(limit=limit) if limit else None
+        self.shared = caches[alias] if alias else None
+        self.timeout = timeout
+
+    def get_key(self, task_id):
+        return self.key_prefix + task_id
+
+    def _get_local(self, task_id):
+        try:
+            expires, meta = self.local[task_id]
+        except KeyError:
+            return None
+        if expires is not None and monotonic() >= expires:
+            self.local.pop(task_id, None)
+            return None
+        return meta
+
+    def _set_local(self, metas):
+        expires = None
+        if self.timeout is not None:
+            expires = monotonic() + self.timeout
+        self.local.update(
+            (task_id, (expires, meta)) for task_id, meta in items(metas)
+        )
+
+    def get(self, task_id):
+        if self.local is not None:
+            meta = self._get_local(task_id)
+            if meta is not None:
+                return meta
+        if self.shared is not None:
+            meta = self.shared.get(self.get_key(task_id))
+            if meta is not None:
+                if self.local is not None:
+                    self._set_local({task_id: meta})
+                return meta
+
+    def get_many(self, task_ids):
+        found, missing = {}, []
+        for task_id in task_ids:
+            meta = self._get_local(task_id) if self.local is not None \
+                else None
+            if meta is None:
+                missing.append(task_id)
+            else:
+                found[task_id] = meta
+        if self.shared is not None and missing:
+            keys = dict((self.get_key(task_id), task_id)
+                        for task_id in missing)
+            shared = dict(
+                (keys[key], meta)
+                for key, meta in items(self.shared.get_many(list(keys)))
+            )
+            if self.local is not None:
+                self._set_local(shared)
+            found.update(shared)
+        return found
+
+    def set(self, task_id, meta):
+        self.set_many({task_id: meta})
+
+    def set_many(self, metas):
+        if self.local is not None:
+            self._set_local(metas)
+        if self.shared is not None:
+            self.shared.set_many(
+                dict((self.get_key(task_id), meta)
+                     for task_id, meta in items(metas)),
+                self.timeout,
+            )
+
+    def delete(self, task_id):
+        if self.local is not None:
+            self.local.pop(task_id, None)
+        if self.shared is not None:
+            self.shared.delete(self.get_key(task_id))
+
+    def clear(self):
+        # Entries in the Django cache cannot be enumerated,
+        # they expire together with the results instead.
+        if self.local is not None:
+            self.local.clear()
+
+
+class PendingCache(object):
+    """Negative cache of tasks not found in the database.
+
+    A task found missing is reported as pending without asking the
+    database again for ``min_ttl`` seconds.  The time doubles for every
+    consecutive miss, up to ``max_ttl`` seconds.  At most ``limit`` tasks
+    are remembered.
+
+    """
+
+    def __init__(self, max_ttl, min_ttl=0.1, limit=10000):
+        self.max_ttl = max_ttl
+        self.min_ttl = min(min_ttl, max_ttl)
+        self.entries = LRUCache(limit=limit)
+
+    def __contains__(self, task_id):
+        try:
+            expires, _ = self.entries[task_id]
+        except KeyError:
+            return False
+        return monotonic() < expires
+
+    def miss(self, task_id):
+        try:
+            _, ttl = self.entries[task_id]
+        except KeyError:
+            ttl = self.min_ttl
+        else:
+            ttl = min(ttl * 2, self.max_ttl)
+        self.entries[task_id] = (monotonic() + ttl, ttl)
+
+    def discard(self, task_id):
+        self.entries.pop(task_id, None)
 
 
-class DatabaseBackend(BaseDictBackend):
+class DatabaseBackend(AsyncBackendMixin, BaseDictBackend):
     """The database backend.
 
     Using Django models to store task state.
 
+    Setting ``CELERY_RESULT_DB_BUFFER_SIZE`` enables write-behind mode:
+    results are then buffered in the worker process and written in bulk
+    when that many results are pending, or at the latest after
+    ``CELERY_RESULT_DB_BUFFER_TIMEOUT`` seconds (default 1.0).
+
+    Setting ``CELERY_RESULT_DB_CACHE_MAX`` keeps the metadata of that many
+    ready tasks in memory, and ``CELERY_RESULT_DB_CACHE`` names a Django
+    cache also used to share it between processes, see
+    :class:`ResultCache`.  Since the result of a ready task never changes,
+    it is then only read from the database once.  Cached results expire
+    after ``CELERY_RESULT_DB_CACHE_TIMEOUT`` seconds (by default when the
+    result expires), so results forgotten by another process may be seen
+    until then.
+
+    Setting ``CELERY_RESULT_DB_PENDING_TTL`` makes lookups of unknown
+    tasks back off: a task not found is reported as pending for an
+    increasing number of seconds, up to this value, before the database
+    is asked again, see :class:`PendingCache`.  Results stored by other
+    processes may then be seen up to this many seconds late.
+
+    Setting ``CELERY_RESULT_DB_NOTIFY`` wakes up processes waiting for
+    results as soon as they are stored, using ``LISTEN``/``NOTIFY`` on the
+    ``CELERY_RESULT_DB_NOTIFY_CHANNEL`` channel on PostgreSQL, and Unix
+    sockets in the ``CELERY_RESULT_DB_NOTIFY_PATH`` directory on other
+    databases (see :mod:`djcelery.backends.notify`).  Waiters then only
+    poll the database every ``CELERY_RESULT_DB_NOTIFY_INTERVAL`` seconds
+    (default 5.0) in case a notification is lost.
+
+    On Python 3 with :mod:`asgiref` installed the awaitable accessors of
+    :class:`~djcelery.backends.aio.AsyncBackendMixin` are available too.
+
     """
     TaskModel = TaskMeta
     TaskSetModel = TaskSetMeta
@@ -25,15 +293,127 @@ class DatabaseBackend(BaseDictBackend):
 
     subpolling_interval = 0.5
 
+    #: Results of groups and chords are fetched using :meth:`get_many`.
+    supports_native_join = True
+
+    #: Maximum number of task ids looked up in a single query.
+    get_many_chunk_size = 500
+
+    #: :class:`ResultBuffer` used in write-behind mode, or :const:`None`.
+    result_buffer = None
+
+    #: :class:`ResultCache` of ready results, or :const:`None`.
+    result_cache = None
+
+    #: :class:`PendingCache` of unknown tasks, or :const:`None`.
+    pending_cache = None
+
+    #: Notifier of stored results, or :const:`None`.
+    notifier = None
+
+    #: Poll interval used while waiting for notifications.
+    notify_poll_interval = 5.0
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseBackend, self).__init__(*args, **kwargs)
+        conf = self.app.conf
+        buffer_size = kwargs.get(
+            'buffer_size', conf.get('CELERY_RESULT_DB_BUFFER_SIZE'),
+        )
+        if buffer_size:
+            self.result_buffer = ResultBuffer(
+                self._store_buffered_results,
+                limit=buffer_size,
+                timeout=kwargs.get(
+                    'buffer_timeout',
+                    conf.get('CELERY_RESULT_DB_BUFFER_TIMEOUT') or 1.0,
+                ),
+            )
+            signals.worker_process_shutdown.connect(self.on_worker_shutdown)
+            signals.worker_shutdown.connect(self.on_worker_shutdown)
+        cache_max = kwargs.get(
+            'cache_max', conf.get('CELERY_RESULT_DB_CACHE_MAX'),
+        )
+        cache_alias = kwargs.get(
+            'cache_alias', conf.get('CELERY_RESULT_DB_CACHE'),
+        )
+        if cache_max or cache_alias:
+            timeout = maybe_timedelta(self.expires)
+            if timeout is not None:
+                timeout = int(max(timeout.total_seconds(), 0))
+            self.result_cache = ResultCache(
+                cache_max, cache_alias,
+                timeout=conf.get('CELERY_RESULT_DB_CACHE_TIMEOUT', timeout),
+            )
+        pending_ttl = kwargs.get(
+            'pending_ttl', conf.get('CELERY_RESULT_DB_PENDING_TTL'),
+        )
+        if pending_ttl:
+            self.pending_cache = PendingCache(pending_ttl)
+        if kwargs.get('notify', conf.get('CELERY_RESULT_DB_NOTIFY')):
+            self.notifier = get_notifier(
+                self.TaskModel._default_manager,
+                channel=conf.get('CELERY_RESULT_DB_NOTIFY_CHANNEL'),
+                path=conf.get('CELERY_RESULT_DB_NOTIFY_PATH'),
+            )
+            self.notify_poll_interval = (
+                conf.get('CELERY_RESULT_DB_NOTIFY_INTERVAL') or
+                self.notify_poll_interval
+            )
+
+    def on_worker_shutdown(self, **kwargs):
+        self.flush()
+
+    def flush(self):
+        """Write any buffered results to the database."""
+        if self.result_buffer is not None:
+            return self.result_buffer.flush()
+
+    def _flush_if_pending(self, *task_ids):
+        buffer = self.result_buffer
+        if buffer is not None and any(t in buffer for t in task_ids):
+            buffer.flush()
+
     def _store_result(self, task_id, result, status,
                       traceback=None, request=None):
         """Store return value and status of an executed task."""
-        self.TaskModel._default_manager.store_result(
-            task_id, result, status,
-            traceback=traceback, children=self.current_task_children(request),
-        )
+        children = self.current_task_children(request)
+        if self.pending_cache is not None:
+            self.pending_cache.discard(task_id)
+        if self.result_cache is not None and status in states.READY_STATES:
+            self.result_cache.set(task_id, {
+                'task_id': task_id, 'status': status, 'result': result,
+                'date_done': now(), 'traceback': traceback,
+                'children': children,
+            })
+        if self.result_buffer is not None:
+            self.result_buffer.add(task_id, {
+                'result': result, 'status': status,
+                'traceback': traceback, 'children': children,
+            })
+        else:
+            self.TaskModel._default_manager.store_result(
+                task_id, result, status,
+                traceback=traceback, children=children,
+            )
+            if status in states.READY_STATES:
+                self._notify([task_id])
         return result
 
+    def _store_buffered_results(self, rows):
+        self.TaskModel._default_manager.store_results(rows)
+        self._notify(row['task_id'] for row in rows
+                     if row['status'] in states.READY_STATES)
+
+    def _notify(self, task_ids):
+        if self.notifier is not None:
+            try:
+                self.notifier.notify(task_ids)
+            except Exception as exc:
+                # waiters will still find the result when polling.
+                logger.warning('Cannot notify result waiters: %r', exc,
+                               exc_info=True)
+
     def _save_group(self, group_id, result):
         """Store the result of an executed group."""
         self.TaskSetModel._default_manager.store_result(group_id, result)
@@ -41,7 +421,215 @@ class DatabaseBackend(BaseDictBackend):
 
     def _get_task_meta_for(self, task_id):
         """Get task metadata for a task by id."""
-        return self.TaskModel._default_manager.get_task(task_id).to_dict()
+        if self.result_cache is not None:
+            meta = self.result_cache.get(task_id)
+            if meta is not None:
+                return meta
+        if self.pending_cache is not None and task_id in self.pending_cache:
+            return self.TaskModel(task_id=task_id).to_dict()
+        self._flush_if_pending(task_id)
+        task = self.TaskModel._default_manager.get_task(task_id)
+        self._update_pending_cache(task_id, task.pk is not None)
+        meta = task.to_dict()
+        if self.result_cache is not None and \
+                meta['status'] in states.READY_STATES:
+            self.result_cache.set(task_id, meta)
+        return meta
+
+    def get_state(self, task_id):
+        """Get the state of a task.
+
+        Unlike :meth:`get_task_meta` this only selects the ``status``
+        column, so polling the state of tasks with large results does not
+        transfer and unpickle the result every time.
+
+        """
+        try:
+            return self._cache[task_id]['status']
+        except KeyError:
+            pass
+        if self.result_cache is not None:
+            meta = self.result_cache.get(task_id)
+            if meta is not None:
+                return meta['status']
+        if self.pending_cache is not None and task_id in self.pending_cache:
+            return states.PENDING
+        self._flush_if_pending(task_id)
+        state = self.TaskModel._default_manager.get_task_state(task_id, None)
+        self._update_pending_cache(task_id, state is not None)
+        return state or states.PENDING
+    get_status = get_state
+
+    def get_states(self, task_ids):
+        """Get the states of many tasks, as a mapping of task id
+        to state, see :meth:`get_state`."""
+        task_ids = set(task_ids)
+        found = {}
+        for task_id in task_ids:
+            try:
+                found[task_id] = self._cache[task_id]['status']
+            except KeyError:
+                pass
+        task_ids.difference_update(found)
+        if self.result_cache is not None and task_ids:
+            for task_id, meta in items(self.result_cache.get_many(task_ids)):
+                found[task_id] = meta['status']
+            task_ids.difference_update(found)
+        if self.pending_cache is not None:
+            for task_id in [t for t in task_ids if t in self.pending_cache]:
+                found[task_id] = states.PENDING
+                task_ids.discard(task_id)
+        if task_ids:
+            self._flush_if_pending(*task_ids)
+            fetched = self.TaskModel._default_manager.get_task_states(
+                task_ids, self.get_many_chunk_size,
+            )
+            for task_id in task_ids:
+                self._update_pending_cache(task_id, task_id in fetched)
+                found[task_id] = fetched.get(task_id, states.PENDING)
+        return found
+
+    def _update_pending_cache(self, task_id, found):
+        if self.pending_cache is not None:
+            if found:
+                self.pending_cache.discard(task_id)
+            else:
+                self.pending_cache.miss(task_id)
+
+    def _get_task_meta_for_many(self, task_ids):
+        """Get task metadata for many tasks by id, in as few queries as
+        possible.
+
+        Returns a mapping of task id to metadata, tasks not found
+        are reported as pending.
+
+        """
+        task_ids = set(task_ids)
+        metas = {}
+        if self.result_cache is not None:
+            metas = self.result_cache.get_many(task_ids)
+            task_ids.difference_update(metas)
+        if self.pending_cache is not None:
+            missing = set(t for t in task_ids if t in self.pending_cache)
+            task_ids.difference_update(missing)
+            metas.update((task_id, self.TaskModel(task_id=task_id).to_dict())
+                         for task_id in missing)
+        self._flush_if_pending(*task_ids)
+        manager = self.TaskModel._default_manager
+        tasks = manager.get_tasks(task_ids, self.get_many_chunk_size)
+        for task_id in task_ids:
+            self._update_pending_cache(task_id, task_id in tasks)
+        fetched = dict(
+            (task_id, (tasks.get(task_id) or
+                       self.TaskModel(task_id=task_id)).to_dict())
+            for task_id in task_ids
+        )
+        if self.result_cache is not None:
+            self.result_cache.set_many(dict(
+                (task_id, meta) for task_id, meta in items(fetched)
+                if meta['status'] in states.READY_STATES
+            ))
+        metas.update(fetched)
+        return metas
+
+    def get_many(self, task_ids, timeout=None, interval=0.5, no_ack=True,
+                 on_message=None, on_interval=None, max_iterations=None,
+                 READY_STATES=states.READY_STATES):
+        """Get the results of many tasks, yielding ``(task_id, meta)``
+        tuples as the tasks become ready.
+
+        Every poll iteration fetches all the remaining tasks using
+        :meth:`_get_task_meta_for_many`.
+
+        """
+        interval = 0.5 if interval is None else interval
+        ids = set(task_ids)
+        cache = self._cache
+        for task_id in list(ids):
+            try:
+                cached = cache[task_id]
+            except KeyError:
+                pass
+            else:
+                if cached['status'] in READY_STATES:
+                    ids.discard(task_id)
+                    yield task_id, cached
+
+        with self.listener() as listener:
+            interval = self.listener_interval(listener, interval)
+            started, iterations = monotonic(), 0
+            while ids:
+                for task_id, meta in items(self._get_task_meta_for_many(ids)):
+                    if meta['status'] in READY_STATES:
+                        ids.discard(task_id)
+                        cache[task_id] = meta
+                        if on_message is not None:
+                            on_message(meta)
+                        yield task_id, meta
+                if not ids:
+                    break
+                if timeout and monotonic() - started >= timeout:
+                    raise TimeoutError(
+                        'Operation timed out ({0})'.format(timeout))
+                if on_interval:
+                    on_interval()
+                self.wait_for_notification(listener, ids, interval)
+                iterations += 1
+                if max_iterations and iterations >= max_iterations:
+                    break
+
+    def wait_for(self, task_id, timeout=None, interval=0.5, no_ack=True,
+                 on_interval=None):
+        """Wait for task and return its result.
+
+        Wakes up as soon as the result is stored if notifications are
+        enabled, and polls the database every ``interval`` seconds
+        otherwise.
+
+        """
+        with self.listener() as listener:
+            interval = self.listener_interval(listener, interval)
+            started = monotonic()
+            while 1:
+                meta = self.get_task_meta(task_id)
+                if meta['status'] in states.READY_STATES:
+                    return meta
+                if on_interval:
+                    on_interval()
+                if timeout:
+                    remaining = timeout - (monotonic() - started)
+                    if remaining <= 0:
+                        raise TimeoutError('The operation timed out.')
+                    interval = min(interval, remaining)
+                self.wait_for_notification(listener, [task_id], interval)
+
+    def listener(self):
+        """Return a :class:`~djcelery.backends.notify.Listener` to wait
+        for stored results with."""
+        if self.notifier is not None:
+            return self.notifier.listener()
+        return PollingListener()
+
+    def listener_interval(self, listener, interval):
+        """Return the interval between lookups when waiting with
+        ``listener``.
+
+        Only polls as a fallback every :attr:`notify_poll_interval`
+        seconds if notifications can be received, e.g. not by
+        a PostgreSQL listener inside a transaction.
+
+        """
+        if listener.receives:
+            return max(interval, self.notify_poll_interval)
+        return interval
+
+    def wait_for_notification(self, listener, task_ids, interval):
+        """Wait at most ``interval`` seconds for a result of one of
+        ``task_ids`` to be stored, using ``listener``."""
+        notified = listener.wait(task_ids, interval)
+        if self.pending_cache is not None:
+            for task_id in notified:
+                self.pending_cache.discard(task_id)
 
     def _restore_group(self, group_id):
         """Get group metadata for a group by id."""
@@ -53,13 +641,60 @@ class DatabaseBackend(BaseDictBackend):
         self.TaskSetModel._default_manager.delete_taskset(group_id)
 
     def _forget(self, task_id):
+        if self.result_buffer is not None:
+            self.result_buffer.discard(task_id)
+        if self.result_cache is not None:
+            self.result_cache.delete(task_id)
+        if self.pending_cache is not None:
+            self.pending_cache.discard(task_id)
         try:
             self.TaskModel._default_manager.get(task_id=task_id).delete()
         except self.TaskModel.DoesNotExist:
             pass
 
     def cleanup(self):
-        """Delete expired metadata."""
+        """Delete expired metadata.
+
+        Deletes in chunks of ``CELERY_RESULT_DB_CLEANUP_CHUNK_SIZE`` rows
+        if set, stopping after ``CELERY_RESULT_DB_CLEANUP_MAX_ROWS`` rows
+        or ``CELERY_RESULT_DB_CLEANUP_TIME_LIMIT`` seconds per table.
+        Task results stored in a partitioned table are removed by dropping
+        the expired partitions instead, after creating the partitions
+        for the next days, see
+        :meth:`~djcelery.managers.PartitionedResultManager.create_partitions`.
+
+        """
         expires = maybe_timedelta(self.expires)
+        conf = self.app.conf
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        chunk_size = conf.get('CELERY_RESULT_DB_CLEANUP_CHUNK_SIZE')
         for model in self.TaskModel, self.TaskSetModel:
-            model._default_manager.delete_expired(expires)
+            table = model._meta.db_table
+            partitioning = getattr(model._default_manager, 'partitioning',
+                                   None)
+            if partitioning is not None and partitioning():
+                created = model._default_manager.create_partitions()
+                logger.info('Cleanup: created partitions of %s: %s',
+                            table, ', '.join(created) or 'none')
+                dropped = model._default_manager.drop_expired_partitions(
+                    expires,
+                )
+                logger.info('Cleanup: dropped expired partitions of %s: %s',
+                            table, ', '.join(dropped) or 'none')
+                continue
+            if chunk_size:
+                deleted = model._default_manager.delete_expired(
+                    expires, chunk_size,
+                    max_rows=conf.get('CELERY_RESULT_DB_CLEANUP_MAX_ROWS'),
+                    time_limit=conf.get('CELERY_RESULT_DB_CLEANUP_TIME_LIMIT'),
+                    progress=partial(self._cleanup_progress, table),
+                )
+            else:
+                deleted = model._default_manager.delete_expired(expires)
+            logger.info('Cleanup: %s expired results deleted from %s.',
+                        deleted, table)
+
+    def _cleanup_progress(self, table, deleted):
+        logger.debug('Cleanup: %s expired results deleted from %s so far.',
+                     deleted, table)
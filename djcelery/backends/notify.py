@@ -0,0 +1,277 @@
+"""Notifying result waiters when task results are stored.
+
+Used by :class:`djcelery.backends.database.DatabaseBackend` when
+``CELERY_RESULT_DB_NOTIFY`` is enabled, so that waiting for a result
+does not have to poll the database.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+import errno
+import os
+import select
+import socket
+import tempfile
+
+from time import sleep
+from uuid import uuid4
+
+from celery.five import monotonic
+
+#: Default PostgreSQL ``NOTIFY`` channel.
+DEFAULT_CHANNEL = 'djcelery_results'
+
+#: Default directory of the sockets used by :class:`SocketNotifier`.
+DEFAULT_SOCKET_DIR = os.path.join(tempfile.gettempdir(), 'djcelery-results')
+
+#: Maximum number of task ids sent in a single notification.
+NOTIFY_CHUNK_SIZE = 50
+
+
+class Listener(object):
+    """Receives the notifications of a notifier until closed."""
+
+    #: False if notifications are never received, so that waiters
+    #: must keep polling at their own interval.
+    receives = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def wait(self, task_ids, timeout):
+        """Wait at most ``timeout`` seconds for a result of one of
+        ``task_ids`` to be stored.
+
+        Returns the set of task ids notified in the meantime, which
+        may include other tasks.
+
+        """
+        task_ids = set(task_ids)
+        notified = set()
+        deadline = monotonic() + timeout
+        while not notified & task_ids:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            notified.update(self.receive(remaining))
+        return notified
+
+    def receive(self, timeout):
+        raise NotImplementedError('Listeners must implement receive')
+
+    def close(self):
+        pass
+
+
+class PollingListener(Listener):
+    """Listener never receiving anything, used without a notifier."""
+    receives = False
+
+    def receive(self, timeout):
+        sleep(timeout)
+        return []
+
+
+class PostgresListener(Listener):
+    """Listens on a PostgreSQL channel using the read connection
+    of ``manager``.
+
+    If ``dedicated`` is set, a separate connection to the same
+    database is opened instead, so that the listener can be shared
+    by the whole process and read while other queries run.
+
+    """
+
+    def __init__(self, manager, channel, dedicated=False):
+        self.manager = manager
+        self.channel = channel
+        self.dedicated = dedicated
+        self._listening = None
+
+    def _execute(self, raw, command):
+        quote_name = self.manager.connection_for_read().ops.quote_name
+        cursor = raw.cursor()
+        try:
+            cursor.execute('{0} {1}'.format(command, quote_name(self.channel)))
+        finally:
+            cursor.close()
+
+    def _listen(self):
+        conn = self.manager.connection_for_read()
+        if self.dedicated:
+            if self._listening is None:
+                raw = conn.get_new_connection(conn.get_connection_params())
+                raw.autocommit = True
+                self._execute(raw, 'LISTEN')
+                self._listening = raw
+            return self._listening
+        conn.ensure_connection()
+        if self._listening is not conn.connection:
+            self._execute(conn.connection, 'LISTEN')
+            self._listening = conn.connection
+        return conn.connection
+
+    def fileno(self):
+        return self._listen().fileno()
+
+    def receive(self, timeout):
+        raw = self._listen()
+        if raw.notifies or select.select([raw], [], [], timeout)[0]:
+            raw.poll()
+        task_ids = [n.payload for n in raw.notifies
+                    if n.channel == self.channel]
+        del raw.notifies[:]
+        return task_ids
+
+    def close(self):
+        raw, self._listening = self._listening, None
+        if raw is None:
+            return
+        if self.dedicated:
+            raw.close()
+        elif raw is self.manager.connection_for_read().connection:
+            self._execute(raw, 'UNLISTEN')
+
+    def __enter__(self):
+        # LISTEN before the first lookup, so that results stored
+        # in the meantime are not missed.
+        self._listen()
+        return self
+
+
+class PostgresNotifier(object):
+    """Notifier using PostgreSQL ``LISTEN``/``NOTIFY``.
+
+    Notifications are delivered when the transaction storing the
+    result commits, to every process listening on ``channel``.
+
+    """
+
+    def __init__(self, manager, channel=DEFAULT_CHANNEL):
+        self.manager = manager
+        self.channel = channel
+
+    def notify(self, task_ids):
+        task_ids = list(task_ids)
+        if task_ids:
+            cursor = self.manager.connection_for_write().cursor()
+            try:
+                cursor.execute(
+                    'SELECT pg_notify(%s, t) FROM unnest(%s) AS t',
+                    [self.channel, task_ids],
+                )
+            finally:
+                cursor.close()
+
+    def listener(self, shared=False):
+        """Return a new listener.
+
+        A ``shared`` listener has its own connection, and is not
+        affected by the transactions of the caller.
+
+        """
+        if shared:
+            return PostgresListener(self.manager, self.channel,
+                                    dedicated=True)
+        if self.manager.connection_for_read().in_atomic_block:
+            # notifications are only delivered between transactions.
+            return PollingListener()
+        return PostgresListener(self.manager, self.channel)
+
+
+class SocketListener(Listener):
+    """Listens on a Unix datagram socket created in ``path``."""
+
+    def __init__(self, path):
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        self.address = os.path.join(path, '{0}-{1}.sock'.format(
+            os.getpid(), uuid4().hex[:12],
+        ))
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.sock.setblocking(0)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self, timeout):
+        task_ids = []
+        if select.select([self.sock], [], [], timeout)[0]:
+            while 1:
+                try:
+                    data = self.sock.recv(65536)
+                except socket.error as exc:
+                    if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        break
+                    raise
+                task_ids.extend(data.decode('utf-8').split('\n'))
+        return task_ids
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.address)
+        except OSError:
+            pass
+
+
+class SocketNotifier(object):
+    """Notifier using Unix datagram sockets, for other databases.
+
+    Every listener binds a socket in the directory ``path``, and
+    notifications are sent to all sockets found there, so this only
+    reaches processes on the same host.
+
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_DIR):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(0)
+
+    def notify(self, task_ids):
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        try:
+            names = os.listdir(self.path)
+        except OSError:  # nobody listening yet.
+            return
+        messages = [
+            '\n'.join(task_ids[i:i + NOTIFY_CHUNK_SIZE]).encode('utf-8')
+            for i in range(0, len(task_ids), NOTIFY_CHUNK_SIZE)
+        ]
+        for name in names:
+            address = os.path.join(self.path, name)
+            for message in messages:
+                try:
+                    self.sock.sendto(message, address)
+                except socket.error as exc:
+                    if exc.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                        # stale socket left by a process that died.
+                        try:
+                            os.unlink(address)
+                        except OSError:
+                            pass
+                        break
+                    if exc.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+
+    def listener(self, shared=False):
+        return SocketListener(self.path)
+
+
+def get_notifier(manager, channel=None, path=None):
+    """Return the notifier to use for the database of ``manager``."""
+    vendor = getattr(manager.connection_for_write(), 'vendor', None)
+    if vendor == 'postgresql':
+        return PostgresNotifier(manager, channel or DEFAULT_CHANNEL)
+    return SocketNotifier(path or DEFAULT_SOCKET_DIR)
@@ -4,10 +4,12 @@ import os
 import imp
 import importlib
 
+from collections import defaultdict
 from datetime import datetime
 from warnings import warn
 
 from celery import signals
+from celery.five import monotonic
 try:
     from celery.utils.collections import DictAttribute
 except ImportError:
@@ -33,9 +35,26 @@ def _maybe_close_fd(fh):
 
 
 class DjangoLoader(BaseLoader):
-    """The Django loader."""
+    """The Django loader.
+
+    By default database connections are closed before every task, or
+    reused for ``CELERY_DB_REUSE_MAX`` tasks if set.
+
+    With ``CELERY_DB_REUSE_POLICY = 'health'`` connections are instead
+    reused for as long as they are healthy: a connection is closed
+    before a task when Django's ``close_if_unusable_or_obsolete()``
+    finds it broken, when it is older than ``CELERY_DB_REUSE_MAX_AGE`` seconds,
+    when it has been used by ``CELERY_DB_REUSE_MAX_TASKS`` tasks, or
+    when ``CELERY_DB_REUSE_PING`` is enabled and it does not answer
+    a ping.  ``CONN_MAX_AGE`` is not used by worker processes then.
+
+    """
     _db_reuse = 0
 
+    #: Counters of the database connections of this process, see
+    #: :meth:`recycle_database`.
+    db_stats = None
+
     override_backends = {
         'database': 'djcelery.backends.database.DatabaseBackend',
         'cache': 'djcelery.backends.cache.CacheBackend',
@@ -43,8 +62,13 @@ class DjangoLoader(BaseLoader):
 
     def __init__(self, *args, **kwargs):
         super(DjangoLoader, self).__init__(*args, **kwargs)
+        self._reset_db_stats()
         self._install_signal_handlers()
 
+    def _reset_db_stats(self):
+        self.db_stats = defaultdict(int)
+        self._db_conns = {}
+
     def _install_signal_handlers(self):
         # Need to close any open database connection after
         # any embedded celerybeat process forks.
@@ -83,6 +107,8 @@ class DjangoLoader(BaseLoader):
                     raise
 
     def close_database(self, **kwargs):
+        if self.conf.get('CELERY_DB_REUSE_POLICY') == 'health':
+            return self.recycle_database(**kwargs)
         db_reuse_max = self.conf.get('CELERY_DB_REUSE_MAX', None)
         if not db_reuse_max:
             return self._close_database()
@@ -91,6 +117,60 @@ class DjangoLoader(BaseLoader):
             self._close_database()
         self._db_reuse += 1
 
+    def recycle_database(self, new_task=False, **kwargs):
+        """Close the database connections that should not be reused.
+
+        :keyword new_task: True if a task is about to use the
+            connections, this is when connections are pinged and
+            task limits are applied.
+
+        The counters in :attr:`db_stats` are updated: ``connects`` is the
+        number of connections opened, ``reuses`` the number of tasks that
+        reused a connection, and ``closed_<reason>`` the number of
+        connections closed for each reason (``unusable``, ``age``,
+        ``tasks`` and ``ping``).
+
+        """
+        conf = self.conf
+        max_age = conf.get('CELERY_DB_REUSE_MAX_AGE')
+        max_tasks = conf.get('CELERY_DB_REUSE_MAX_TASKS')
+        ping = new_task and conf.get('CELERY_DB_REUSE_PING')
+        for conn in db.connections.all():
+            if conn.connection is None:
+                self._db_conns.pop(conn.alias, None)
+                continue
+            state = self._db_conns.get(conn.alias)
+            if state is None or state['connection'] is not conn.connection:
+                # connected since the last check.
+                self.db_stats['connects'] += 1
+                state = self._db_conns[conn.alias] = {
+                    'connection': conn.connection,
+                    'opened': monotonic(),
+                    'tasks': 0,
+                }
+            # age is limited by CELERY_DB_REUSE_MAX_AGE below.
+            conn.close_at = None
+            conn.close_if_unusable_or_obsolete()
+            if conn.connection is None:
+                reason = 'unusable'
+            elif max_age and monotonic() - state['opened'] >= max_age:
+                reason = 'age'
+            elif new_task and max_tasks and state['tasks'] >= max_tasks:
+                reason = 'tasks'
+            elif ping and not conn.is_usable():
+                reason = 'ping'
+            else:
+                if new_task:
+                    state['tasks'] += 1
+                    self.db_stats['reuses'] += 1
+                continue
+            self.db_stats['closed_' + reason] += 1
+            del self._db_conns[conn.alias]
+            try:
+                conn.close()
+            except DATABASE_ERRORS:
+                pass
+
     def close_cache(self):
         try:
             cache.cache.close()
@@ -114,7 +194,7 @@ class DjangoLoader(BaseLoader):
         except AttributeError:
             is_eager = False
         if not is_eager:
-            self.close_database()
+            self.close_database(new_task=True)
 
     def on_worker_init(self):
         """Called when the worker starts.
@@ -159,6 +239,7 @@ class DjangoLoader(BaseLoader):
         # use the _ version to avoid DB_REUSE preventing the conn.close() call
         self._close_database()
         self.close_cache()
+        self._reset_db_stats()
 
     def mail_admins(self, subject, body, fail_silently=False, **kwargs):
         return mail_admins(subject, body, fail_silently=fail_silently)
@@ -0,0 +1,44 @@
+"""
+
+Create partitions of the task result table in advance.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djcelery.app import app
+from djcelery.models import TaskMeta
+
+
+class Command(BaseCommand):
+    """Create partitions of the task result table in advance."""
+    help = ('Creates future partitions of the task result table, '
+            'see CELERY_RESULT_DB_PARTITION.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=None,
+            help='Number of partitions to create after the current one '
+                 '(default: CELERY_RESULT_DB_PARTITIONS_AHEAD, or 7 days '
+                 'or 48 hours).',
+        )
+        parser.add_argument(
+            '--drop-expired', action='store_true', default=False,
+            help='Also drop partitions older than '
+                 'CELERY_TASK_RESULT_EXPIRES.',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the management command."""
+        manager = TaskMeta._default_manager
+        interval = manager.partitioning()
+        if not interval:
+            raise CommandError('CELERY_RESULT_DB_PARTITION is not set.')
+        for name in manager.create_partitions(options['ahead']):
+            self.stdout.write('Created partition {0}'.format(name))
+        if options['drop_expired']:
+            expires = app.conf.CELERY_TASK_RESULT_EXPIRES
+            if expires:
+                for name in manager.drop_expired_partitions(expires):
+                    self.stdout.write('Dropped partition {0}'.format(name))
@@ -4,7 +4,9 @@ import sys
 import warnings
 import re
 
-from functools import wraps
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import partial, wraps
 from itertools import count
 
 from django.db import connection
@@ -16,6 +18,10 @@ except ImportError:  # pre-Django 1.2
 from django.db import models
 from django.db.models.query import QuerySet
 from django.conf import settings
+from django.utils import timezone
+
+from celery import states
+from celery.five import monotonic
 
 try:
     from celery.utils.timeutils import maybe_timedelta
@@ -23,9 +29,25 @@ except ImportError:
     from celery.utils.time import maybe_timedelta
 
 from .db import commit_on_success, get_queryset, rollback_unless_managed
+from .metrics import RuntimeSketch
+from .picklefield import decode_lazy_values
 from .utils import now
 
 
+#: Database vendors able to do an insert-or-update in a single statement.
+UPSERT_VENDORS = frozenset(['postgresql', 'mysql', 'sqlite'])
+
+#: Supported ``CELERY_RESULT_DB_PARTITION`` values, as
+#: ``(partition name date format, partition size)`` tuples.
+PARTITION_INTERVALS = {
+    'daily': ('%Y%m%d', timedelta(days=1)),
+    'hourly': ('%Y%m%d%H', timedelta(hours=1)),
+}
+
+#: Default number of partitions created in advance, by partition interval.
+PARTITIONS_AHEAD = {'daily': 7, 'hourly': 48}
+
+
 class TxIsolationWarning(UserWarning):
     pass
 
@@ -69,8 +91,51 @@ def update_model_with_dict(obj, fields):
     return obj
 
 
+_decoding_iterables = {}
+
+
+def _decoding_iterable(iterable_class):
+    """Subclass of ``iterable_class`` decoding lazily loaded pickled
+    values, see :func:`~djcelery.picklefield.decode_lazy_values`."""
+    try:
+        return _decoding_iterables[iterable_class]
+    except KeyError:
+        pass
+
+    def __iter__(self):
+        for row in iterable_class.__iter__(self):
+            yield decode_lazy_values(row)
+
+    cls = _decoding_iterables[iterable_class] = type(
+        str('Decoding' + iterable_class.__name__), (iterable_class, ),
+        {'__iter__': __iter__},
+    )
+    _decoding_iterables[cls] = cls
+    return cls
+
+
 class ExtendedQuerySet(QuerySet):
 
+    def values(self, *fields, **expressions):
+        return self._decode_values(
+            super(ExtendedQuerySet, self).values(*fields, **expressions),
+        )
+
+    def values_list(self, *fields, **kwargs):
+        return self._decode_values(
+            super(ExtendedQuerySet, self).values_list(*fields, **kwargs),
+        )
+
+    def _decode_values(self, clone):
+        # Lazy pickled fields are only decoded by the model attribute,
+        # so values must be decoded here when there is no model.
+        iterable_class = getattr(clone, '_iterable_class', None)
+        if iterable_class is not None and any(
+                getattr(field, 'lazy', False)
+                for field in self.model._meta.concrete_fields):
+            clone._iterable_class = _decoding_iterable(iterable_class)
+        return clone
+
     def update_or_create(self, **kwargs):
         obj, created = self.get_or_create(**kwargs)
 
@@ -107,15 +172,163 @@ class ExtendedManager(models.Manager):
         except AttributeError:
             return settings.DATABASE_ENGINE
 
+    def supports_upsert(self):
+        """Return true if the write database can do a native upsert."""
+        conn = self.connection_for_write()
+        vendor = getattr(conn, 'vendor', None)
+        if vendor == 'sqlite':
+            # ON CONFLICT ... DO UPDATE was added in SQLite 3.24.
+            return conn.Database.sqlite_version_info >= (3, 24, 0)
+        return vendor in UPSERT_VENDORS
+
+    def delete_in_chunks(self, queryset, chunk_size=1000, max_rows=None,
+                         time_limit=None, progress=None):
+        """Delete the rows matched by ``queryset`` in primary key order.
+
+        Every chunk of at most ``chunk_size`` rows is deleted in
+        a separate transaction, so other writers are never blocked
+        for long.
+
+        :keyword max_rows: Stop after deleting this many rows.
+        :keyword time_limit: Do not start a new chunk after this
+            many seconds.
+        :keyword progress: Called with the total number of rows
+            deleted so far after every chunk.
+
+        Returns the number of rows deleted.
+
+        """
+        started, deleted, last_pk = monotonic(), 0, None
+        queryset = queryset.order_by('pk')
+        while max_rows is None or deleted < max_rows:
+            limit = chunk_size
+            if max_rows is not None:
+                limit = min(limit, max_rows - deleted)
+            chunk = queryset
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list('pk', flat=True)[:limit])
+            if not pks:
+                break
+            with commit_on_success():
+                self.filter(pk__in=pks).delete()
+            deleted += len(pks)
+            last_pk = pks[-1]
+            if progress is not None:
+                progress(deleted)
+            if time_limit is not None and \
+                    monotonic() - started >= time_limit:
+                break
+        return deleted
+
+    def upsert(self, lookup, defaults=None):
+        """Insert or update a row using a single statement.
+
+        :param lookup: Mapping with exactly one unique field to match on.
+        :keyword defaults: Fields written both when the row is inserted
+            and when it already exists.
+
+        Fields with ``auto_now`` are always refreshed, other fields
+        keep their current value when the row already exists.
+        Only available if :meth:`supports_upsert` returns true.
+
+        """
+        (key, ) = lookup
+        row = dict(defaults or {}, **lookup)
+        return self.upsert_many(key, [row], update_fields=list(defaults or ()))
+
+    def upsert_many(self, key, rows, update_fields=None):
+        """Insert or update many rows using multi-row upsert statements.
+
+        :param key: Name of the unique field to match existing rows on.
+        :param rows: List of field mappings, all including ``key``.
+            If several rows have the same key only the last one is
+            written.
+        :keyword update_fields: Fields to write when the row already
+            exists, defaults to all fields in ``rows`` except ``key``.
+
+        Only available if :meth:`supports_upsert` returns true.
+
+        """
+        rows = list(OrderedDict((row[key], row) for row in rows).values())
+        if update_fields is None:
+            update_fields = set(f for row in rows for f in row) - set([key])
+        conn = self.connection_for_write()
+        fields = [f for f in self.model._meta.concrete_fields
+                  if not f.auto_created]
+        batch_size = max(conn.ops.bulk_batch_size(fields, rows), 1)
+        affected = 0
+        for i in range(0, len(rows), batch_size):
+            affected += self._upsert(
+                conn, key, fields, rows[i:i + batch_size], update_fields,
+            )
+        return affected
+
+    def _upsert(self, conn, key, fields, rows, update_fields):
+        meta = self.model._meta
+        updated = set(update_fields)
+        update_columns = [
+            f.column for f in fields
+            if f.name in updated or getattr(f, 'auto_now', False)
+        ]
+        params = []
+        for row in rows:
+            obj = self.model(**row)
+            params.extend(
+                f.get_db_prep_save(f.pre_save(obj, True), connection=conn)
+                for f in fields
+            )
+        qn = conn.ops.quote_name
+        placeholder = '({0})'.format(', '.join(['%s'] * len(fields)))
+        sql = 'INSERT INTO {0} ({1}) VALUES {2}'.format(
+            qn(meta.db_table),
+            ', '.join(qn(f.column) for f in fields),
+            ', '.join([placeholder] * len(rows)),
+        )
+        key_column = meta.get_field(key).column
+        if conn.vendor == 'mysql':
+            sql += ' ON DUPLICATE KEY UPDATE ' + ', '.join(
+                '{0} = VALUES({0})'.format(qn(column))
+                for column in update_columns or [key_column]
+            )
+        elif update_columns:
+            sql += ' ON CONFLICT ({0}) DO UPDATE SET {1}'.format(
+                qn(key_column),
+                ', '.join('{0} = EXCLUDED.{0}'.format(qn(column))
+                          for column in update_columns),
+            )
+        else:
+            sql += ' ON CONFLICT ({0}) DO NOTHING'.format(qn(key_column))
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
 
 class ResultManager(ExtendedManager):
 
+    def active(self):
+        """Get all visible results, most recent first."""
+        return self.filter(hidden=False).order_by('-date_done')
+
     def get_all_expired(self, expires):
         """Get all expired task results."""
         return self.filter(date_done__lt=now() - maybe_timedelta(expires))
 
-    def delete_expired(self, expires):
-        """Delete all expired taskset results."""
+    def delete_expired(self, expires, chunk_size=None, **kwargs):
+        """Delete all expired taskset results.
+
+        If ``chunk_size`` is set the results are deleted in chunks,
+        each in its own transaction, see :meth:`delete_in_chunks`
+        for the remaining keyword arguments.  Otherwise everything is
+        deleted in a single transaction.
+
+        Returns the number of rows deleted.
+
+        """
+        if chunk_size:
+            return self.delete_in_chunks(
+                self.get_all_expired(expires), chunk_size, **kwargs
+            )
         meta = self.model._meta
         with commit_on_success():
             self.get_all_expired(expires).update(hidden=True)
@@ -124,6 +337,176 @@ class ResultManager(ExtendedManager):
                 'DELETE FROM {0.db_table} WHERE hidden=%s'.format(meta),
                 (True, ),
             )
+            return cursor.rowcount
+
+
+class PartitionedResultManager(ResultManager):
+    """Manager for results optionally stored in a table partitioned
+    by ``date_done``.
+
+    Partitioning is enabled by setting ``CELERY_RESULT_DB_PARTITION`` to
+    ``"daily"`` or ``"hourly"``, and is supported on PostgreSQL 11+ and
+    MySQL.  The table itself must be converted by the database
+    administrator, as the unique key on ``task_id`` has to include
+    ``date_done`` on partitioned tables, e.g. on PostgreSQL::
+
+        CREATE TABLE celery_taskmeta_new (
+            LIKE celery_taskmeta INCLUDING DEFAULTS,
+            PRIMARY KEY (id, date_done),
+            UNIQUE (task_id, date_done)
+        ) PARTITION BY RANGE (date_done);
+
+    and on MySQL (without a ``MAXVALUE`` partition)::
+
+        ALTER TABLE celery_taskmeta
+            DROP INDEX task_id,
+            DROP PRIMARY KEY, ADD PRIMARY KEY (id, date_done),
+            ADD UNIQUE KEY (task_id, date_done)
+            PARTITION BY RANGE COLUMNS (date_done) (
+                PARTITION p20260101 VALUES LESS THAN ('2026-01-02'));
+
+    Partitions are named after the table and the start of their
+    range, e.g. ``celery_taskmeta_p20261018``, and are created in
+    advance by the daily result cleanup, or by the
+    :program:`djcelerypartitions` management command.
+    Expired results are then removed by dropping whole partitions.
+
+    """
+
+    def partitioning(self):
+        """Return the partition interval name, or :const:`None`."""
+        interval = getattr(settings, 'CELERY_RESULT_DB_PARTITION', None)
+        if interval and interval not in PARTITION_INTERVALS:
+            raise ValueError(
+                'CELERY_RESULT_DB_PARTITION must be one of {0}, not {1!r}'
+                .format(', '.join(sorted(PARTITION_INTERVALS)), interval))
+        return interval
+
+    def supports_upsert(self):
+        # The unique key includes date_done on partitioned tables,
+        # so there is nothing to match the upsert on.
+        if self.partitioning():
+            return False
+        return super(PartitionedResultManager, self).supports_upsert()
+
+    def create_partitions(self, ahead=None, nowfun=timezone.now):
+        """Create the partitions for the current interval and
+        the ``ahead`` following ones, returns the names of the
+        partitions created.
+
+        ``ahead`` defaults to the ``CELERY_RESULT_DB_PARTITIONS_AHEAD``
+        setting, or 7 daily or 48 hourly partitions.
+
+        """
+        conn, interval = self._partitioned_connection()
+        if ahead is None:
+            ahead = getattr(settings, 'CELERY_RESULT_DB_PARTITIONS_AHEAD',
+                            None) or PARTITIONS_AHEAD[interval]
+        fmt, size = PARTITION_INTERVALS[interval]
+        start = nowfun().replace(minute=0, second=0, microsecond=0)
+        if interval == 'daily':
+            start = start.replace(hour=0)
+        existing = self.get_partitions()
+        last = max(existing.values()) if existing else None
+        created = []
+        with conn.cursor() as cursor:
+            for i in range(ahead + 1):
+                lower = start + size * i
+                name = self._partition_name(lower, fmt)
+                if name in existing or (
+                        conn.vendor == 'mysql' and last and lower <= last):
+                    # MySQL can only add partitions after the last one.
+                    continue
+                cursor.execute(*self._create_partition_sql(
+                    conn, name, lower, lower + size))
+                created.append(name)
+        return created
+
+    def drop_expired_partitions(self, expires, nowfun=timezone.now):
+        """Drop the partitions only holding results older than
+        ``expires``, returns the names of the partitions dropped."""
+        conn, interval = self._partitioned_connection()
+        size = PARTITION_INTERVALS[interval][1]
+        cutoff = nowfun() - maybe_timedelta(expires)
+        partitions = self.get_partitions()
+        expired = sorted(name for name, lower in partitions.items()
+                         if lower + size <= cutoff)
+        if conn.vendor == 'mysql' and len(expired) == len(partitions):
+            # a partitioned table must keep at least one partition.
+            expired = expired[:-1]
+        if expired:
+            qn = conn.ops.quote_name
+            with conn.cursor() as cursor:
+                if conn.vendor == 'mysql':
+                    cursor.execute('ALTER TABLE {0} DROP PARTITION {1}'.format(
+                        qn(self.model._meta.db_table),
+                        ', '.join(qn(name) for name in expired),
+                    ))
+                else:
+                    for name in expired:
+                        cursor.execute('DROP TABLE IF EXISTS {0}'.format(
+                            qn(name)))
+        return expired
+
+    def get_partitions(self):
+        """Return a mapping of partition name to the start of its range."""
+        conn, interval = self._partitioned_connection()
+        fmt = PARTITION_INTERVALS[interval][0]
+        table = self.model._meta.db_table
+        with conn.cursor() as cursor:
+            if conn.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT partition_name FROM information_schema.partitions'
+                    ' WHERE table_schema = DATABASE() AND table_name = %s'
+                    ' AND partition_name IS NOT NULL', [table])
+            else:
+                cursor.execute(
+                    'SELECT c.relname FROM pg_inherits i'
+                    ' JOIN pg_class c ON c.oid = i.inhrelid'
+                    ' JOIN pg_class p ON p.oid = i.inhparent'
+                    ' WHERE p.relname = %s', [table])
+            names = [row[0] for row in cursor.fetchall()]
+        prefix = self._partition_name(None, fmt)
+        partitions = {}
+        for name in names:
+            if name.startswith(prefix):
+                try:
+                    lower = datetime.strptime(name[len(prefix):], fmt)
+                except ValueError:
+                    continue
+                if settings.USE_TZ:
+                    lower = timezone.make_aware(lower, timezone.utc)
+                partitions[name] = lower
+        return partitions
+
+    def _partitioned_connection(self):
+        interval = self.partitioning()
+        if not interval:
+            raise RuntimeError('CELERY_RESULT_DB_PARTITION is not set')
+        conn = self.connection_for_write()
+        if conn.vendor not in ('postgresql', 'mysql'):
+            raise NotImplementedError(
+                'Partitioned results are not supported on {0}'.format(
+                    conn.vendor))
+        return conn, interval
+
+    def _partition_name(self, lower, fmt):
+        if settings.USE_TZ and lower is not None:
+            lower = timezone.make_naive(lower, timezone.utc)
+        return '{0}_p{1}'.format(self.model._meta.db_table,
+                                 lower.strftime(fmt) if lower else '')
+
+    def _create_partition_sql(self, conn, name, lower, upper):
+        qn = conn.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        if conn.vendor == 'mysql':
+            return ('ALTER TABLE {0} ADD PARTITION '
+                    '(PARTITION {1} VALUES LESS THAN (%s))'.format(
+                        table, qn(name)),
+                    [conn.ops.adapt_datetimefield_value(upper)])
+        return ('CREATE TABLE IF NOT EXISTS {0} PARTITION OF {1} '
+                'FOR VALUES FROM (%s) TO (%s)'.format(qn(name), table),
+                [lower, upper])
 
 
 class PeriodicTaskManager(ExtendedManager):
@@ -135,7 +518,7 @@ class PeriodicTaskManager(ExtendedManager):
         return self.get(name=name)
 
 
-class TaskManager(ResultManager):
+class TaskManager(PartitionedResultManager):
     """Manager for :class:`celery.models.Task` models."""
     _last_id = None
 
@@ -156,6 +539,51 @@ class TaskManager(ResultManager):
             self._last_id = task_id
             return self.model(task_id=task_id)
 
+    def get_task_state(self, task_id, default=states.PENDING):
+        """Get the status of a task by ``task_id``.
+
+        Only the ``status`` column is selected, so the (possibly large)
+        result, traceback and meta payloads are neither transferred nor
+        unpickled.  Returns ``default`` if the task is not found.
+
+        """
+        for status in self.filter(task_id=task_id).values_list(
+                'status', flat=True)[:1]:
+            return status
+        return default
+
+    def get_tasks(self, task_ids, chunk_size=500):
+        """Get task meta for many tasks by ``task_id``.
+
+        Returns a mapping of task id to task meta for the tasks found,
+        using one ``task_id IN (...)`` query per ``chunk_size`` ids.
+
+        """
+        task_ids = list(task_ids)
+        tasks = {}
+        for i in range(0, len(task_ids), chunk_size):
+            tasks.update(
+                (task.task_id, task)
+                for task in self.filter(task_id__in=task_ids[i:i + chunk_size])
+            )
+        return tasks
+
+    def get_task_states(self, task_ids, chunk_size=500):
+        """Get the status of many tasks by ``task_id``.
+
+        Returns a mapping of task id to status for the tasks found,
+        selecting only these two columns.
+
+        """
+        task_ids = list(task_ids)
+        found = {}
+        for i in range(0, len(task_ids), chunk_size):
+            found.update(
+                self.filter(task_id__in=task_ids[i:i + chunk_size])
+                    .values_list('task_id', 'status')
+            )
+        return found
+
     @transaction_retry(max_retries=2)
     def store_result(self, task_id, result, status,
                      traceback=None, children=None):
@@ -181,28 +609,86 @@ class TaskManager(ResultManager):
             happen in a race condition if another worker is trying to
             create the same task. The default is to retry twice.
 
+        The result is written using a single upsert statement on
+        databases supporting it (PostgreSQL, MySQL and SQLite 3.24+).
+        Returns :const:`None`, as the stored row is not fetched back.
+
         """
-        return self.update_or_create(task_id=task_id,
-                                     defaults={'status': status,
-                                               'result': result,
-                                               'traceback': traceback,
-                                               'meta': {'children': children}})
+        defaults = self._result_fields(result, status, traceback, children)
+        if self.supports_upsert():
+            self.upsert({'task_id': task_id}, defaults)
+        else:
+            self.update_or_create(task_id=task_id, defaults=defaults)
+
+    @transaction_retry(max_retries=2)
+    def store_results(self, results):
+        """Store the result and status of many tasks at once.
+
+        :param results: List of mappings with the ``task_id``, ``result``,
+            ``status``, and optionally ``traceback`` and ``children``
+            arguments of :meth:`store_result` for each task.
+
+        On databases supporting upserts all results are written
+        using a single statement, otherwise they are stored one by one
+        in a single transaction.
+
+        """
+        rows = [
+            dict(self._result_fields(r['result'], r['status'],
+                                     r.get('traceback'), r.get('children')),
+                 task_id=r['task_id'])
+            for r in results
+        ]
+        if self.supports_upsert():
+            return self.upsert_many('task_id', rows)
+        with commit_on_success():
+            for row in rows:
+                task_id = row.pop('task_id')
+                self.update_or_create(task_id=task_id, defaults=row)
+        return len(rows)
+
+    def _result_fields(self, result, status, traceback=None, children=None):
+        return {'status': status,
+                'result': result,
+                'traceback': traceback,
+                'meta': {'children': children}}
 
     def warn_if_repeatable_read(self):
         if 'mysql' in self.current_engine().lower():
-            cursor = self.connection_for_read().cursor()
-            if self._get_server_version_info_for_mysql() >= (5, 7, 20):
+            isolation = self._get_session_info_for_mysql()[1]
+            if isolation == 'REPEATABLE-READ':
+                warnings.warn(TxIsolationWarning(
+                    'Polling results with transaction isolation level '
+                    'repeatable-read within the same transaction '
+                    'may give outdated results. Be sure to commit the '
+                    'transaction for each poll iteration.'))
+
+    def _get_session_info_for_mysql(self):
+        """Return the server version and transaction isolation level
+        of the read connection, as a ``(version, isolation)`` tuple.
+
+        These are only queried once per database connection.
+
+        """
+        conn = self.connection_for_read()
+        conn.ensure_connection()
+        cached = getattr(conn, '_djcelery_mysql_info', None)
+        if cached is not None and cached[0] is conn.connection:
+            return cached[1:]
+        version = self._get_server_version_info_for_mysql()
+        cursor = conn.cursor()
+        try:
+            if version >= (5, 7, 20):
                 ok = cursor.execute("SELECT @@transaction_isolation")
             else:
                 ok = cursor.execute("SELECT @@tx_isolation")
-            if ok:
-                isolation = cursor.fetchone()[0]
-                if isolation == 'REPEATABLE-READ':
-                    warnings.warn(TxIsolationWarning(
-                        'Polling results with transaction isolation level '
-                        'repeatable-read within the same transaction '
-                        'may give outdated results. Be sure to commit the '
-                        'transaction for each poll iteration.'))
+            isolation = cursor.fetchone()[0] if ok else None
+        finally:
+            cursor.close()
+        if isinstance(isolation, bytes):
+            isolation = isolation.decode()
+        conn._djcelery_mysql_info = (conn.connection, version, isolation)
+        return version, isolation
 
     def _get_server_version_info_for_mysql(self):
         cursor = self.connection_for_read().cursor()
@@ -247,9 +733,14 @@ class TaskSetManager(ResultManager):
 
         :param result: The return value of the taskset
 
+        Returns :const:`None`, see :meth:`TaskManager.store_result`.
+
         """
-        return self.update_or_create(taskset_id=taskset_id,
-                                     defaults={'result': result})
+        defaults = {'result': result}
+        if self.supports_upsert():
+            self.upsert({'taskset_id': taskset_id}, defaults)
+        else:
+            self.update_or_create(taskset_id=taskset_id, defaults=defaults)
 
 
 class TaskStateManager(ExtendedManager):
@@ -265,6 +756,139 @@ class TaskStateManager(ExtendedManager):
         if expires is not None:
             return self.expired(states, expires).update(hidden=True)
 
-    def purge(self):
+    def purge(self, chunk_size=None, **kwargs):
+        """Delete the hidden tasks.
+
+        If ``chunk_size`` is set the tasks are deleted in chunks,
+        each in its own transaction, see :meth:`delete_in_chunks`
+        for the remaining keyword arguments.
+
+        """
+        if chunk_size:
+            return self.delete_in_chunks(self.filter(hidden=True),
+                                         chunk_size, **kwargs)
         with commit_on_success():
             self.model.objects.filter(hidden=True).delete()
+
+    def delete_expired_by_states(self, expires_by_states, chunk_size=1000,
+                                 max_rows=None, time_limit=None,
+                                 progress=None):
+        """Delete the tasks expired in every state in chunks, each in
+        its own transaction, see :meth:`delete_in_chunks`.
+
+        :param expires_by_states: Mapping of state sets to the time
+            after which tasks in those states expire, or :const:`None`
+            if they never do.
+
+        Expired tasks are deleted directly instead of first being
+        hidden by :meth:`expire_by_states`, and tasks hidden before
+        are deleted as well.  ``max_rows`` and ``time_limit`` apply
+        to all states together, and the time limit is only checked
+        once a chunk was deleted.
+
+        Returns the number of rows deleted.
+
+        """
+        querysets = [self.filter(hidden=True)] + [
+            self.expired(states, expires)
+            for states, expires in expires_by_states.items()
+            if expires is not None
+        ]
+        started, deleted = monotonic(), 0
+        for queryset in querysets:
+            remaining_rows = remaining_time = None
+            if max_rows is not None:
+                remaining_rows = max_rows - deleted
+                if remaining_rows <= 0:
+                    break
+            if time_limit is not None:
+                remaining_time = time_limit - (monotonic() - started)
+                # like delete_in_chunks(), at least one chunk is deleted.
+                if remaining_time <= 0 and deleted:
+                    break
+                remaining_time = max(remaining_time, 0)
+            deleted += self.delete_in_chunks(
+                queryset, chunk_size, max_rows=remaining_rows,
+                time_limit=remaining_time,
+                progress=progress and partial(self._progress, progress,
+                                              deleted),
+            )
+        return deleted
+
+    def _progress(self, progress, offset, deleted):
+        progress(offset + deleted)
+
+
+class TaskRollupManager(ExtendedManager):
+    _fields = ('count', 'runtime_count', 'runtime_sum', 'runtime_sketch')
+
+    def record(self, rollups):
+        """Add the counts of the unsaved ``rollups`` to the stored
+        rollups for the same period, start, task name and state,
+        creating those not stored yet.
+
+        Rollups are merged in memory, so they should only be recorded
+        by a single process, usually the snapshot camera.
+        Returns the list of written rollups.
+
+        """
+        if not rollups:
+            return []
+
+        def key(rollup):
+            return rollup.period, rollup.start, rollup.name, rollup.state
+
+        with commit_on_success():
+            stored = dict((key(obj), obj) for obj in self.filter(
+                period__in=set(rollup.period for rollup in rollups),
+                start__in=set(rollup.start for rollup in rollups),
+                name__in=set(rollup.name for rollup in rollups),
+            ))
+            created, updated = [], []
+            for rollup in rollups:
+                obj = stored.get(key(rollup))
+                if obj is None:
+                    stored[key(rollup)] = rollup
+                    created.append(rollup)
+                elif obj.pk is None:
+                    obj.merge(rollup)
+                else:
+                    updated.append(obj.merge(rollup))
+            for obj in created + updated:
+                obj.runtime_sketch = obj.sketch.dumps()
+            if created:
+                self.bulk_create(created)
+            if updated:
+                if hasattr(self, 'bulk_update'):  # Django 2.2+
+                    self.bulk_update(updated, self._fields)
+                else:
+                    for obj in updated:
+                        obj.save(update_fields=self._fields)
+        return created + updated
+
+    def expire(self, period, expires, nowfun=now):
+        """Delete the ``period`` rollups older than ``expires``.
+
+        Returns the number of rollups deleted.
+
+        """
+        if expires is not None:
+            expired = self.filter(
+                period=period,
+                start__lt=nowfun() - maybe_timedelta(expires),
+            )
+            # QuerySet.delete() returns None before Django 1.9.
+            count = expired.count()
+            if count:
+                expired.delete()
+            return count
+
+    def runtime_sketch(self, **filters):
+        """Return the merged :class:`~djcelery.metrics.RuntimeSketch`
+        of the rollups matching ``filters``, e.g. to get the
+        execution time quantiles of a task over a day."""
+        sketch = RuntimeSketch()
+        for value in self.filter(**filters).values_list('runtime_sketch',
+                                                        flat=True):
+            sketch.merge(RuntimeSketch.loads(value))
+        return sketch
@@ -0,0 +1,107 @@
+"""Time-bucketed task metrics, see :class:`djcelery.models.TaskRollup`."""
+from __future__ import absolute_import, unicode_literals
+
+import json
+import math
+
+from collections import OrderedDict
+
+from celery.five import items
+
+from .utils import fromtimestamp
+
+#: Rollup periods and their length in seconds.
+PERIODS = OrderedDict([
+    ('minute', 60),
+    ('hour', 60 * 60),
+])
+
+#: Relative error of the quantiles estimated by :class:`RuntimeSketch`.
+#: Changing it makes the stored sketches unreadable.
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+#: Runtimes below this are counted as this value by the sketches.
+SKETCH_MIN_VALUE = 1e-6
+
+
+def period_start(period, timestamp):
+    """Return the start of the ``period`` containing the POSIX
+    ``timestamp``, as a datetime.
+
+    Periods are aligned in UTC, so that an hour starts at the same
+    instant in every timezone.
+
+    """
+    seconds = PERIODS[period]
+    return fromtimestamp(timestamp - timestamp % seconds)
+
+
+class RuntimeSketch(object):
+    """Mergeable quantile sketch of task runtimes.
+
+    Runtimes are counted in logarithmically sized buckets, so the
+    estimated quantiles are within :data:`SKETCH_RELATIVE_ACCURACY` of
+    the real runtimes while the sketch stays small: one bucket covers
+    a 2% range, and there are less than 2000 buckets from a microsecond
+    to a day.  Sketches of different rollups are merged by adding the
+    bucket counts.
+
+    """
+    gamma = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+    _log_gamma = math.log(gamma)
+
+    def __init__(self, buckets=None):
+        self.buckets = dict(buckets or {})
+
+    def __len__(self):
+        return sum(self.buckets.values())
+
+    def __eq__(self, other):
+        if isinstance(other, RuntimeSketch):
+            return self.buckets == other.buckets
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def add(self, value, count=1):
+        """Count ``value`` ``count`` times."""
+        index = int(math.ceil(
+            math.log(max(value, SKETCH_MIN_VALUE)) / self._log_gamma,
+        ))
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        """Add the counts of the ``other`` sketch to this one."""
+        for index, count in items(other.buckets):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        """Return the estimated ``q`` quantile (``0 <= q <= 1``), or
+        :const:`None` if nothing was counted."""
+        total = len(self)
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                break
+        # the value with the same relative distance to both bounds.
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def dumps(self):
+        return json.dumps(
+            dict((str(index), count) for index, count in items(self.buckets)),
+            sort_keys=True, separators=(',', ':'),
+        )
+
+    @classmethod
+    def loads(cls, value):
+        return cls(
+            (int(index), count)
+            for index, count in items(json.loads(value or '{}'))
+        )
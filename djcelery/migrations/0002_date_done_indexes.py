@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+# Partial index used to list the most recent visible results, created
+# with SQL rather than Meta.indexes (Django 2.2+), so that the migration
+# state is the same on every supported version of Django.  Only the
+# engines supporting partial indexes get it.
+INDEX_NAME = 'celery_taskmeta_visible_idx'
+INDEX_VENDORS = ('postgresql', 'sqlite')
+
+
+def create_visible_index(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEX_VENDORS:
+        quote_name = schema_editor.quote_name
+        schema_editor.execute(
+            'CREATE INDEX {0} ON {1} ({2} DESC) WHERE NOT {3}'.format(
+                quote_name(INDEX_NAME), quote_name('celery_taskmeta'),
+                quote_name('date_done'), quote_name('hidden'),
+            ),
+        )
+
+
+def drop_visible_index(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEX_VENDORS:
+        schema_editor.execute(
+            'DROP INDEX {0}'.format(schema_editor.quote_name(INDEX_NAME)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djcelery', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskmeta',
+            name='date_done',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='done at'),
+        ),
+        migrations.AlterField(
+            model_name='tasksetmeta',
+            name='date_done',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='created at'),
+        ),
+        migrations.RunPython(create_visible_index, drop_visible_index),
+    ]
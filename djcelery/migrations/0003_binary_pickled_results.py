@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import djcelery.picklefield
+
+
+class Migration(migrations.Migration):
+    # Existing base64 encoded values are kept as is by the column
+    # type conversion, and are still decoded by the binary fields.
+
+    dependencies = [
+        ('djcelery', '0002_date_done_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskmeta',
+            name='meta',
+            field=djcelery.picklefield.PickledObjectField(binary=True, default=None, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='taskmeta',
+            name='result',
+            field=djcelery.picklefield.PickledObjectField(binary=True, default=None, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tasksetmeta',
+            name='result',
+            field=djcelery.picklefield.PickledObjectField(binary=True, editable=False),
+        ),
+    ]
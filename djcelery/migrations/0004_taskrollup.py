@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djcelery', '0003_binary_pickled_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRollup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('period', models.CharField(max_length=16, verbose_name='period', choices=[('minute', 'minute'), ('hour', 'hour')])),
+                ('start', models.DateTimeField(verbose_name='period start', db_index=True)),
+                ('name', models.CharField(max_length=200, verbose_name='name')),
+                ('state', models.CharField(max_length=64, verbose_name='state', choices=[('FAILURE', 'FAILURE'), ('PENDING', 'PENDING'), ('RECEIVED', 'RECEIVED'), ('RETRY', 'RETRY'), ('REVOKED', 'REVOKED'), ('STARTED', 'STARTED'), ('SUCCESS', 'SUCCESS')])),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='count')),
+                ('runtime_count', models.PositiveIntegerField(default=0, help_text='number of tasks with an execution time', verbose_name='runtimes')),
+                ('runtime_sum', models.FloatField(default=0.0, help_text='sum of execution times in seconds', verbose_name='execution time')),
+                ('runtime_sketch', models.TextField(default='{}', editable=False, verbose_name='execution time sketch')),
+            ],
+            options={
+                'ordering': ['-start'],
+                'get_latest_by': 'start',
+                'verbose_name': 'task rollup',
+                'verbose_name_plural': 'task rollups',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskrollup',
+            unique_together=set([('period', 'start', 'name', 'state')]),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Created with SQL rather than Meta.indexes (Django 1.11+), so that the
+# migration state is the same on every supported version of Django.
+INDEX_NAME = 'celery_taskstate_expiry_idx'
+
+
+def create_index(apps, schema_editor):
+    quote_name = schema_editor.quote_name
+    schema_editor.execute('CREATE INDEX {0} ON {1} ({2}, {3})'.format(
+        quote_name(INDEX_NAME), quote_name('celery_taskstate'),
+        quote_name('state'), quote_name('tstamp'),
+    ))
+
+
+def drop_index(apps, schema_editor):
+    quote_name = schema_editor.quote_name
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX {0} ON {1}'.format(
+            quote_name(INDEX_NAME), quote_name('celery_taskstate'),
+        ))
+    else:
+        schema_editor.execute(
+            'DROP INDEX {0}'.format(quote_name(INDEX_NAME)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djcelery', '0004_taskrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -14,11 +14,17 @@ from celery import states
 from celery.events.state import heartbeat_expires
 
 from . import managers
+from .metrics import PERIODS, RuntimeSketch
 from .picklefield import PickledObjectField
 from .utils import now
 from .compat import python_2_unicode_compatible
 
 ALL_STATES = sorted(states.ALL_STATES)
+
+# Pickled results at least this large are compressed.
+RESULT_COMPRESS_MIN_SIZE = getattr(
+    settings, 'CELERY_RESULT_DB_COMPRESS_MIN_SIZE', 1024,
+)
 TASK_STATE_CHOICES = sorted(zip(ALL_STATES, ALL_STATES))
 
 
@@ -34,14 +40,20 @@ class TaskMeta(models.Model):
         _('state'),
         max_length=50, default=states.PENDING, choices=TASK_STATE_CHOICES,
     )
-    result = PickledObjectField(null=True, default=None, editable=False)
-    date_done = models.DateTimeField(_('done at'), auto_now=True)
+    result = PickledObjectField(
+        binary=True, compress_min_size=RESULT_COMPRESS_MIN_SIZE, lazy=True,
+        null=True, default=None, editable=False,
+    )
+    date_done = models.DateTimeField(_('done at'), auto_now=True,
+                                     db_index=True)
     traceback = models.TextField(_('traceback'), blank=True, null=True)
     hidden = models.BooleanField(editable=False, default=False, db_index=True)
-    # TODO compression was enabled by mistake, we need to disable it
-    # but this is a backwards incompatible change that needs planning.
+    # Values without codec header are zlib compressed, since
+    # compression was always enabled for this field.
     meta = PickledObjectField(
-        compress=True, null=True, default=None, editable=False,
+        compress=True, binary=True,
+        compress_min_size=RESULT_COMPRESS_MIN_SIZE, lazy=True,
+        null=True, default=None, editable=False,
     )
 
     objects = managers.TaskManager()
@@ -50,6 +62,8 @@ class TaskMeta(models.Model):
         verbose_name = _('task state')
         verbose_name_plural = _('task states')
         db_table = 'celery_taskmeta'
+        # The partial index of the visible results by date_done is
+        # created by migration 0002, see there.
 
     def to_dict(self):
         return {'task_id': self.task_id,
@@ -67,8 +81,11 @@ class TaskMeta(models.Model):
 class TaskSetMeta(models.Model):
     """TaskSet result"""
     taskset_id = models.CharField(_('group id'), max_length=255, unique=True)
-    result = PickledObjectField()
-    date_done = models.DateTimeField(_('created at'), auto_now=True)
+    result = PickledObjectField(
+        binary=True, compress_min_size=RESULT_COMPRESS_MIN_SIZE, lazy=True,
+    )
+    date_done = models.DateTimeField(_('created at'), auto_now=True,
+                                     db_index=True)
     hidden = models.BooleanField(editable=False, default=False, db_index=True)
 
     objects = managers.TaskSetManager()
@@ -370,6 +387,8 @@ class TaskState(models.Model):
         verbose_name_plural = _('tasks')
         get_latest_by = 'tstamp'
         ordering = ['-tstamp']
+        # The (state, tstamp) index used by TaskStateManager.expired()
+        # is created by migration 0005, see there.
 
     def __str__(self):
         name = self.name or 'UNKNOWN'
@@ -382,3 +401,81 @@ class TaskState(models.Model):
         return '<TaskState: {0.state} {1}[{0.task_id}] ts:{0.tstamp}>'.format(
             self, self.name or 'UNKNOWN',
         )
+
+
+@python_2_unicode_compatible
+class TaskRollup(models.Model):
+    """Number of tasks entering a state, by task name, over a minute
+    or an hour, maintained by the snapshot camera when the
+    ``CELERYCAM_ROLLUP`` setting is enabled."""
+    period = models.CharField(
+        _('period'), max_length=16,
+        choices=[(period, period) for period in PERIODS],
+    )
+    start = models.DateTimeField(_('period start'), db_index=True)
+    name = models.CharField(_('name'), max_length=200)
+    state = models.CharField(
+        _('state'), max_length=64, choices=TASK_STATE_CHOICES,
+    )
+    count = models.PositiveIntegerField(_('count'), default=0)
+    runtime_count = models.PositiveIntegerField(
+        _('runtimes'), default=0,
+        help_text=_('number of tasks with an execution time'),
+    )
+    runtime_sum = models.FloatField(
+        _('execution time'), default=0.0,
+        help_text=_('sum of execution times in seconds'),
+    )
+    runtime_sketch = models.TextField(_('execution time sketch'),
+                                      editable=False, default='{}')
+
+    objects = managers.TaskRollupManager()
+
+    class Meta:
+        """Model meta-data."""
+        verbose_name = _('task rollup')
+        verbose_name_plural = _('task rollups')
+        get_latest_by = 'start'
+        ordering = ['-start']
+        unique_together = ('period', 'start', 'name', 'state')
+
+    def __str__(self):
+        return '{0.period} {0.start} {0.name} {0.state}: {0.count}'.format(
+            self,
+        )
+
+    @property
+    def sketch(self):
+        """:class:`~djcelery.metrics.RuntimeSketch` of the execution
+        times, written back to :attr:`runtime_sketch` by
+        :meth:`TaskRollupManager.record`."""
+        try:
+            return self._sketch
+        except AttributeError:
+            self._sketch = RuntimeSketch.loads(self.runtime_sketch)
+            return self._sketch
+
+    @property
+    def runtime_avg(self):
+        if self.runtime_count:
+            return self.runtime_sum / self.runtime_count
+
+    def runtime_quantile(self, q):
+        """Estimated execution time ``q`` quantile, e.g. ``0.99``."""
+        return self.sketch.quantile(q)
+
+    def add(self, runtime=None, count=1):
+        """Count a task, and its execution time if known."""
+        self.count += count
+        if runtime is not None:
+            self.runtime_count += count
+            self.runtime_sum += runtime * count
+            self.sketch.add(runtime, count)
+
+    def merge(self, other):
+        """Add the counts of the ``other`` rollup to this one."""
+        self.count += other.count
+        self.runtime_count += other.runtime_count
+        self.runtime_sum += other.runtime_sum
+        self.sketch.merge(other.sketch)
+        return self
@@ -15,22 +15,32 @@
 from __future__ import absolute_import, unicode_literals
 
 import django
+import warnings
 
 from base64 import b64encode, b64decode
 from zlib import compress, decompress
 
-from celery.five import with_metaclass
+from celery.five import string_t, with_metaclass
 from celery.utils.serialization import pickle
 from kombu.utils.encoding import bytes_to_str, str_to_bytes
 
+from django.conf import settings
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
 
 from django.utils.encoding import force_str
 
 DEFAULT_PROTOCOL = 2
 
+#: Pickle protocol used by fields stored as binary.
+BINARY_PROTOCOL = min(pickle.HIGHEST_PROTOCOL, 4)
+
 NO_DECOMPRESS_HEADER = b'\x1e\x00r8d9qwwerwhA@'
 
+#: Header of values written with a compression codec (or explicitly
+#: without one), followed by the one byte codec id.
+CODEC_HEADER = b'\x1e\x01'
+
 
 if django.VERSION >= (1, 8):
     BaseField = models.Field
@@ -47,38 +57,221 @@ class PickledObject(str):
     pass
 
 
-def maybe_compress(value, do_compress=False):
+class LazyPickledValue(object):
+    """Database value of a lazy :class:`PickledObjectField`,
+    not decoded yet."""
+    __slots__ = ('raw', 'field')
+
+    def __init__(self, raw, field):
+        self.raw = raw
+        self.field = field
+
+    def decode(self):
+        return self.field.to_python(self.raw)
+
+
+def decode_lazy_values(row):
+    """Decode the :class:`LazyPickledValue` values of a row returned
+    by :meth:`~django.db.models.query.QuerySet.values` or
+    :meth:`~django.db.models.query.QuerySet.values_list`."""
+    if isinstance(row, LazyPickledValue):
+        return row.decode()
+    if isinstance(row, dict):
+        return dict((key, decode_lazy_values(value))
+                    for key, value in row.items())
+    if isinstance(row, tuple):
+        values = [value.decode() if isinstance(value, LazyPickledValue)
+                  else value for value in row]
+        # named tuples returned with named=True.
+        return row._make(values) if hasattr(row, '_make') else tuple(values)
+    return row
+
+
+class PickledObjectDescriptor(DeferredAttribute):
+    """Decodes lazily loaded values on first access, and caches them."""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super(PickledObjectDescriptor, self).__get__(instance, cls)
+        if isinstance(value, LazyPickledValue):
+            value = instance.__dict__[self.field.attname] = value.decode()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class Codec(object):
+    """Compression codec, identified in stored values by ``id``."""
+
+    def __init__(self, name, id, compress, decompress):
+        self.name = name
+        self.id = id
+        self.compress = compress
+        self.decompress = decompress
+
+
+#: Registered codecs by name.
+codecs = {}
+
+#: Registered codecs by id.
+codecs_by_id = {}
+
+
+def register_codec(name, id, compress, decompress):
+    codec = codecs[name] = codecs_by_id[id] = Codec(
+        name, id, compress, decompress,
+    )
+    return codec
+
+
+def get_codec(name):
+    """Get codec by name, falling back to zlib if it is unavailable."""
+    try:
+        return codecs[name]
+    except KeyError:
+        warnings.warn(
+            'Compression codec {0!r} is not available, using zlib.'.format(
+                name))
+        return codecs['zlib']
+
+
+register_codec('none', b'\x00', lambda data: data, lambda data: data)
+register_codec('zlib', b'\x01', compress, decompress)
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    pass
+else:
+    register_codec('lz4', b'\x02', lz4.frame.compress, lz4.frame.decompress)
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    pass
+else:
+    register_codec(
+        'zstd', b'\x03',
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+def maybe_compress(value, do_compress=False, codec=None, min_size=None):
+    """Compress value with ``codec`` if ``do_compress`` is set, or if
+    ``min_size`` is set and the value is at least that many bytes.
+
+    The result starts with :data:`CODEC_HEADER` and the codec id, unless
+    it is not compressed and ``do_compress`` is not set, so that
+    :func:`maybe_decompress` can tell it apart from values written by
+    earlier versions.
+
+    """
+    value = str_to_bytes(value)
+    compressed_field = do_compress
+    if min_size is not None:
+        do_compress = len(value) >= min_size
     if do_compress:
-        return compress(str_to_bytes(value))
+        codec = get_codec(codec or 'zlib')
+        return CODEC_HEADER + codec.id + codec.compress(value)
+    if compressed_field:
+        # values without header are assumed to be zlib compressed.
+        return CODEC_HEADER + codecs['none'].id + value
     return value
 
 
 def maybe_decompress(value, do_decompress=False):
+    if str_to_bytes(value[:2]) == CODEC_HEADER:
+        value = str_to_bytes(value)
+        return codecs_by_id[value[2:3]].decompress(value[3:])
     if do_decompress:
         if str_to_bytes(value[:15]) != NO_DECOMPRESS_HEADER:
             return decompress(str_to_bytes(value))
     return value
 
 
-def encode(value, compress_object=False, pickle_protocol=DEFAULT_PROTOCOL):
+def encode(value, compress_object=False, pickle_protocol=DEFAULT_PROTOCOL,
+           codec=None, min_size=None):
     return bytes_to_str(b64encode(maybe_compress(
-        pickle.dumps(value, pickle_protocol), compress_object),
-    ))
+        pickle.dumps(value, pickle_protocol), compress_object,
+        codec, min_size,
+    )))
 
 
 def decode(value, compress_object=False):
     return pickle.loads(maybe_decompress(b64decode(value), compress_object))
 
 
-class PickledObjectField(BaseField):
+def encode_binary(value, compress_object=False,
+                  pickle_protocol=BINARY_PROTOCOL, codec=None, min_size=None):
+    return maybe_compress(pickle.dumps(value, pickle_protocol),
+                          compress_object, codec, min_size)
+
+
+def decode_binary(value, compress_object=False):
+    if isinstance(value, string_t):
+        value = str_to_bytes(value)
+    else:
+        value = bytes(value)
+    try:
+        return pickle.loads(maybe_decompress(value, compress_object))
+    except Exception:
+        # Values written before the column was converted to binary
+        # are still base64 encoded.
+        return decode(value, compress_object)
 
-    def __init__(self, compress=False, protocol=DEFAULT_PROTOCOL,
+
+class PickledObjectField(BaseField):
+    """Field storing a pickled Python object.
+
+    By default the pickle is base64 encoded and stored in a text
+    column.  With ``binary=True`` it is stored as is in a binary column,
+    using pickle protocol :data:`BINARY_PROTOCOL` by default.  Binary
+    fields can still read base64 encoded values, so existing text columns
+    can be converted in place by a migration.
+
+    Values are compressed if ``compress`` is set, or if
+    ``compress_min_size`` is set and the pickle is at least that many
+    bytes (values smaller than that are then never compressed).  The
+    compression ``codec`` is one of ``"zlib"``, ``"lz4"`` or ``"zstd"``,
+    defaulting to the ``CELERY_RESULT_DB_COMPRESSION`` setting.  The codec
+    used is recorded in the stored value, so changing it does not affect
+    existing rows.
+
+    With ``lazy=True`` values loaded from the database are only
+    unpickled when the attribute is first accessed (Django 3.0+),
+    and are saved back without being decoded if never accessed.
+    Querysets of lazy fields must decode the values they return
+    without a model instance, see
+    :class:`djcelery.managers.ExtendedQuerySet`.
+
+    """
+    descriptor_class = PickledObjectDescriptor
+
+    def __init__(self, compress=False, protocol=None, binary=False,
+                 codec=None, compress_min_size=None, lazy=False,
                  *args, **kwargs):
         self.compress = compress
+        self.binary = binary
+        self.codec = codec
+        self.compress_min_size = compress_min_size
+        # older versions do not use descriptor_class.
+        self.lazy = lazy and django.VERSION >= (3, 0)
+        if protocol is None:
+            protocol = BINARY_PROTOCOL if binary else DEFAULT_PROTOCOL
         self.protocol = protocol
         kwargs.setdefault('editable', False)
         super(PickledObjectField, self).__init__(*args, **kwargs)
 
+    def deconstruct(self):
+        name, path, args, kwargs = super(
+            PickledObjectField, self).deconstruct()
+        if self.binary:
+            kwargs['binary'] = True
+        return name, path, args, kwargs
+
     def get_default(self):
         if self.has_default():
             return self.default() if callable(self.default) else self.default
@@ -87,6 +280,8 @@ class PickledObjectField(BaseField):
     def to_python(self, value):
         if value is not None:
             try:
+                if self.binary:
+                    return decode_binary(value, self.compress)
                 return decode(value, self.compress)
             except Exception:
                 if isinstance(value, PickledObject):
@@ -94,18 +289,53 @@ class PickledObjectField(BaseField):
                 return value
 
     def from_db_value(self, value, expression, connection, context = None):
+        if self.lazy and value is not None:
+            return LazyPickledValue(value, self)
         return self.to_python(value)
 
-    def get_db_prep_value(self, value, **kwargs):
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, LazyPickledValue):
+            # never accessed, so no need to decode it.
+            return value
+        return super(PickledObjectField, self).pre_save(model_instance, add)
+
+    def get_codec(self):
+        return self.codec or getattr(settings, 'CELERY_RESULT_DB_COMPRESSION',
+                                     'zlib')
+
+    def get_db_prep_value(self, value, connection=None, **kwargs):
+        if isinstance(value, LazyPickledValue):
+            value = value.raw
+            if self.binary and connection is not None:
+                return connection.Database.Binary(bytes(value))
+            return value
         if value is not None and not isinstance(value, PickledObject):
-            return force_str(encode(value, self.compress, self.protocol))
+            if self.binary:
+                value = encode_binary(
+                    value, self.compress, self.protocol,
+                    self.get_codec(), self.compress_min_size,
+                )
+                if connection is not None:
+                    return connection.Database.Binary(value)
+                return value
+            return force_str(encode(
+                value, self.compress, self.protocol,
+                self.get_codec(), self.compress_min_size,
+            ))
         return value
 
     def value_to_string(self, obj):
-        return self.get_db_prep_value(self._get_val_from_obj(obj))
+        value = self._get_val_from_obj(obj)
+        if self.binary and value is not None:
+            return bytes_to_str(b64encode(encode_binary(
+                value, self.compress, self.protocol,
+                self.get_codec(), self.compress_min_size,
+            )))
+        return self.get_db_prep_value(value)
 
     def get_internal_type(self):
-        return 'TextField'
+        return 'BinaryField' if self.binary else 'TextField'
 
     def get_db_prep_lookup(self, lookup_type, value, *args, **kwargs):
         if lookup_type not in ['exact', 'in', 'isnull']:
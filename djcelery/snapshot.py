@@ -1,14 +1,17 @@
 from __future__ import absolute_import, unicode_literals
 
+import threading
+
 from collections import defaultdict
 from datetime import timedelta
 
+from django import db
 from django.conf import settings
 
 from celery import states
 from celery.events.state import Task
 from celery.events.snapshot import Polaroid
-from celery.five import monotonic
+from celery.five import Queue, items, monotonic
 from celery.utils.log import get_logger
 
 try:
@@ -16,7 +19,9 @@ try:
 except ImportError:
     from celery.utils.time import maybe_iso8601
 
-from .models import WorkerState, TaskState
+from .db import commit_on_success
+from .metrics import PERIODS, period_start
+from .models import WorkerState, TaskState, TaskRollup
 from .utils import fromtimestamp, correct_awareness
 
 WORKER_UPDATE_FREQ = 60  # limit worker timestamp write freq.
@@ -31,6 +36,37 @@ EXPIRE_PENDING = getattr(settings, 'CELERYCAM_EXPIRE_PENDING',
                          timedelta(days=5))
 NOT_SAVED_ATTRIBUTES = frozenset(['name', 'args', 'kwargs', 'eta'])
 
+# Expired tasks are deleted in chunks of this many rows, each in its own
+# transaction, for at most CELERYCAM_CLEANUP_TIME_LIMIT seconds per cleanup.
+# Set to None to delete them in a single transaction.
+CLEANUP_CHUNK_SIZE = getattr(settings, 'CELERYCAM_CLEANUP_CHUNK_SIZE', 1000)
+CLEANUP_TIME_LIMIT = getattr(settings, 'CELERYCAM_CLEANUP_TIME_LIMIT', 30.0)
+
+# Maintain TaskRollup rows while snapshotting.
+ROLLUP = getattr(settings, 'CELERYCAM_ROLLUP', False)
+EXPIRE_ROLLUP_MINUTE = getattr(settings, 'CELERYCAM_EXPIRE_ROLLUP_MINUTE',
+                               timedelta(days=2))
+EXPIRE_ROLLUP_HOUR = getattr(settings, 'CELERYCAM_EXPIRE_ROLLUP_HOUR',
+                             timedelta(days=90))
+
+# The task attributes holding the time a task entered each state,
+# so that the rollups count every state a task went through.
+ROLLUP_STATE_FIELDS = (
+    (states.PENDING, 'sent'),
+    (states.RECEIVED, 'received'),
+    (states.STARTED, 'started'),
+    (states.SUCCESS, 'succeeded'),
+    (states.FAILURE, 'failed'),
+    (states.RETRY, 'retried'),
+    (states.REVOKED, 'revoked'),
+)
+
+# Bounded mode: flush as soon as this many tasks changed since the last
+# snapshot, and write snapshots from a separate thread, with at most
+# CELERYCAM_WRITE_QUEUE_SIZE snapshots waiting to be written.
+MAX_BUFFERED_TASKS = getattr(settings, 'CELERYCAM_MAX_BUFFERED_TASKS', None)
+WRITE_QUEUE_SIZE = getattr(settings, 'CELERYCAM_WRITE_QUEUE_SIZE', 2)
+
 logger = get_logger(__name__)
 debug = logger.debug
 
@@ -38,9 +74,20 @@ debug = logger.debug
 class Camera(Polaroid):
     TaskState = TaskState
     WorkerState = WorkerState
+    TaskRollup = TaskRollup
 
     clear_after = True
     worker_update_freq = WORKER_UPDATE_FREQ
+    cleanup_chunk_size = CLEANUP_CHUNK_SIZE
+    cleanup_time_limit = CLEANUP_TIME_LIMIT
+    max_buffered_tasks = MAX_BUFFERED_TASKS
+    write_queue_size = WRITE_QUEUE_SIZE
+    rollup = ROLLUP
+    rollup_periods = tuple(PERIODS)
+    expire_rollups = {
+        'minute': EXPIRE_ROLLUP_MINUTE,
+        'hour': EXPIRE_ROLLUP_HOUR,
+    }
     expire_states = {
         SUCCESS_STATES: EXPIRE_SUCCESS,
         states.EXCEPTION_STATES: EXPIRE_ERROR,
@@ -50,6 +97,27 @@ class Camera(Polaroid):
     def __init__(self, *args, **kwargs):
         super(Camera, self).__init__(*args, **kwargs)
         self._last_worker_write = defaultdict(lambda: (None, None))
+        # signatures of the tasks and workers last written, so that
+        # only those changed since are written by the next shutter.
+        self._task_signatures = {}
+        self._worker_signatures = {}
+        # timestamps of the states already counted in the rollups,
+        # by task id and state.
+        self._rollup_counted = {}
+        self._signature_mutex = threading.Lock()
+        # primary keys of the stored workers by hostname, so that
+        # task rows can refer to them without querying.
+        self._worker_ids = {}
+        # bounded mode: ids of the tasks changed since the last snapshot,
+        # snapshots waiting to be written and event counters.
+        self._buffered = set()
+        self._buffer_limit = 0
+        self._buffer_mutex = threading.Lock()
+        self._capture_mutex = threading.Lock()
+        self._queue = Queue(self.write_queue_size)
+        self._state_event = self.state.event
+        self._writer = None
+        self.stats = defaultdict(int)
 
     def get_heartbeat(self, worker):
         try:
@@ -58,25 +126,119 @@ class Camera(Polaroid):
             return
         return fromtimestamp(heartbeat)
 
+    def get_worker_signature(self, worker):
+        """Return a value changing whenever the stored fields of
+        ``worker`` change."""
+        return worker.heartbeats[-1] if worker.heartbeats else None
+
+    def get_task_signature(self, task):
+        """Return a value changing whenever ``task`` receives an event."""
+        return task.state, task.timestamp
+
+    def _worker_write_due(self, hostname, now=None):
+        last_write, _ = self._last_worker_write[hostname]
+        now = monotonic() if now is None else now
+        return not last_write or now - last_write > self.worker_update_freq
+
+    def _worker_written(self, hostname, worker, obj, now=None):
+        self._last_worker_write[hostname] = (
+            monotonic() if now is None else now, obj,
+        )
+        self._worker_signatures[hostname] = self.get_worker_signature(worker)
+        self._worker_ids[hostname] = obj.pk
+
     def handle_worker(self, hostname_worker):
         (hostname, worker) = hostname_worker
-        last_write, obj = self._last_worker_write[hostname]
-        if not last_write or \
-                monotonic() - last_write > self.worker_update_freq:
+        if self._worker_write_due(hostname):
             obj, _ = self.WorkerState.objects.update_or_create(
                 hostname=hostname,
                 defaults={'last_heartbeat': self.get_heartbeat(worker)},
             )
-            self._last_worker_write[hostname] = (monotonic(), obj)
-        return obj
+            self._worker_written(hostname, worker, obj)
+        return self._last_worker_write[hostname][1]
+
+    def handle_workers(self, hostname_workers):
+        """Store the heartbeats of many workers using one upsert
+        statement, or :meth:`bulk_create` and :meth:`bulk_update` on
+        databases not supporting it.
+
+        Workers written less than :attr:`worker_update_freq` seconds
+        ago are skipped.
+
+        """
+        now = monotonic()
+        due = dict(
+            (hostname, worker) for hostname, worker in hostname_workers
+            if self._worker_write_due(hostname, now)
+        )
+        if not due:
+            return
+        rows = [{'hostname': hostname,
+                 'last_heartbeat': self.get_heartbeat(worker)}
+                for hostname, worker in items(due)]
+        objects = self.WorkerState.objects
+        with commit_on_success():
+            if objects.supports_upsert():
+                objects.upsert_many('hostname', rows,
+                                    update_fields=['last_heartbeat'])
+            else:
+                self._write_workers(objects, rows)
+        # rows inserted by the bulk write have no primary key yet.
+        missing = [hostname for hostname in due
+                   if hostname not in self._worker_ids]
+        if missing:
+            self._worker_ids.update(
+                objects.filter(hostname__in=missing)
+                       .values_list('hostname', 'pk')
+            )
+        for row in rows:
+            hostname = row['hostname']
+            obj = self.WorkerState(pk=self._worker_ids[hostname], **row)
+            self._worker_written(hostname, due[hostname], obj, now)
+
+    def _write_workers(self, objects, rows):
+        stored = dict(
+            (obj.hostname, obj) for obj in
+            objects.filter(hostname__in=[row['hostname'] for row in rows])
+        )
+        created, updated = [], []
+        for row in rows:
+            obj = stored.get(row['hostname'])
+            if obj is None:
+                created.append(self.WorkerState(**row))
+            else:
+                obj.last_heartbeat = row['last_heartbeat']
+                updated.append(obj)
+                self._worker_ids[obj.hostname] = obj.pk
+        if created:
+            objects.bulk_create(created)
+        if updated:
+            if hasattr(objects, 'bulk_update'):  # Django 2.2+
+                objects.bulk_update(updated, ['last_heartbeat'])
+            else:
+                for obj in updated:
+                    obj.save(update_fields=['last_heartbeat'])
+
+    def get_worker_id(self, hostname, worker):
+        """Return the primary key of the stored worker ``hostname``,
+        only storing the worker if it was not stored already."""
+        try:
+            return self._worker_ids[hostname]
+        except KeyError:
+            return self.handle_worker((hostname, worker)).pk
 
     def handle_task(self, uuid_task, worker=None):
         """Handle snapshotted event."""
         uuid, task = uuid_task
+        return self.update_task(task.state, task_id=uuid,
+                                defaults=self.get_task_fields(task, worker))
+
+    def get_task_fields(self, task, worker=None):
+        """Return the :class:`TaskState` fields of a snapshotted task."""
         if task.worker and task.worker.hostname:
-            worker = self.handle_worker(
-                (task.worker.hostname, task.worker),
-            )
+            worker_id = self.get_worker_id(task.worker.hostname, task.worker)
+        else:
+            worker_id = worker.pk if worker is not None else None
 
         defaults = {
             'name': task.name,
@@ -89,15 +251,14 @@ class Camera(Polaroid):
             'result': task.result or task.exception,
             'traceback': task.traceback,
             'runtime': task.runtime,
-            'worker': worker
+            'worker_id': worker_id,
         }
         # Some fields are only stored in the RECEIVED event,
         # so we should remove these from default values,
         # so that they are not overwritten by subsequent states.
         [defaults.pop(attr, None) for attr in NOT_SAVED_ATTRIBUTES
          if defaults[attr] is None]
-        return self.update_task(task.state,
-                                task_id=uuid, defaults=defaults)
+        return defaults
 
     def update_task(self, state, **kwargs):
         objects = self.TaskState.objects
@@ -107,31 +268,345 @@ class Camera(Polaroid):
         obj, created = objects.get_or_create(defaults=defaults, **kwargs)
         if created:
             return obj
-        else:
-            if states.state(state) < states.state(obj.state):
-                keep = Task.merge_rules[states.RECEIVED]
-                defaults = dict(
-                    (k, v) for k, v in defaults.items()
-                    if k not in keep
-                )
-
-        for k, v in defaults.items():
-            setattr(obj, k, v)
+        self.merge_task(obj, state, defaults)
         obj.save()
 
         return obj
 
+    def merge_task(self, obj, state, fields):
+        """Update the stored task ``obj`` with the ``fields`` of a task
+        in ``state``, keeping the fields only sent by the received
+        event if ``state`` precedes the stored state."""
+        if states.state(state) < states.state(obj.state):
+            keep = Task.merge_rules[states.RECEIVED]
+            fields = dict(
+                (k, v) for k, v in items(fields)
+                if k not in keep
+            )
+        for k, v in items(fields):
+            setattr(obj, k, v)
+        return obj
+
+    def handle_tasks(self, uuid_tasks):
+        """Store many snapshotted tasks in a single transaction.
+
+        The stored tasks are fetched using a single query and merged
+        in memory, then all tasks are written using one upsert statement
+        on databases supporting it, or with :meth:`bulk_create` and
+        :meth:`bulk_update` otherwise.
+
+        Returns the list of stored :class:`TaskState` objects.
+
+        """
+        pending = [
+            (uuid, task.state, self.get_task_fields(task))
+            for uuid, task in uuid_tasks
+        ]
+        pending = [(uuid, state, fields) for uuid, state, fields in pending
+                   if fields.get('name')]
+        if not pending:
+            return []
+        objects = self.TaskState.objects
+        with commit_on_success():
+            stored = dict(
+                (obj.task_id, obj) for obj in
+                objects.filter(task_id__in=[uuid for uuid, _, _ in pending])
+            )
+            created, updated = [], []
+            for uuid, state, fields in pending:
+                obj = stored.get(uuid)
+                if obj is None:
+                    created.append(self.TaskState(task_id=uuid, **fields))
+                else:
+                    updated.append(self.merge_task(obj, state, fields))
+            self._write_tasks(objects, created, updated)
+        return created + updated
+
+    def _write_tasks(self, objects, created, updated):
+        fields = [f for f in self.TaskState._meta.concrete_fields
+                  if not f.primary_key]
+        if objects.supports_upsert():
+            objects.upsert_many(
+                'task_id',
+                [dict((f.attname, getattr(obj, f.attname)) for f in fields)
+                 for obj in created + updated],
+                update_fields=[f.name for f in fields if f.name != 'task_id'],
+            )
+            return
+        if created:
+            objects.bulk_create(created)
+        if updated:
+            names = [f.name for f in fields if f.name != 'task_id']
+            if hasattr(objects, 'bulk_update'):  # Django 2.2+
+                objects.bulk_update(updated, names)
+            else:
+                for obj in updated:
+                    obj.save(update_fields=names)
+
+    def get_task_states(self, task):
+        """Return the ``(state, timestamp)`` pairs of the states
+        ``task`` entered, as far as known."""
+        entered = [(state, getattr(task, field, None))
+                   for state, field in ROLLUP_STATE_FIELDS]
+        entered = [(state, timestamp) for state, timestamp in entered
+                   if timestamp is not None]
+        if task.timestamp is not None and \
+                task.state not in dict(entered):
+            entered.append((task.state, task.timestamp))
+        return entered
+
+    def handle_rollups(self, transitions):
+        """Count the ``(task, [(state, timestamp), ...])`` transitions
+        of a snapshot in the :class:`TaskRollup` of every period,
+        each state in the period containing its timestamp.
+
+        Returns the list of written :class:`TaskRollup` objects.
+
+        """
+        rollups = {}
+        for task, entered in transitions:
+            if not task.name:
+                continue
+            for state, timestamp in entered:
+                # the execution time belongs to the final state.
+                runtime = task.runtime if state == task.state else None
+                for period in self.rollup_periods:
+                    start = period_start(period, timestamp)
+                    key = (period, start, task.name, state)
+                    rollup = rollups.get(key)
+                    if rollup is None:
+                        rollup = rollups[key] = self.TaskRollup(
+                            period=period, start=start,
+                            name=task.name, state=state,
+                        )
+                    rollup.add(runtime)
+        return self.TaskRollup.objects.record(list(rollups.values()))
+
+    def take_snapshot(self, state, copy=False):
+        """Return the workers and tasks of ``state`` changed since the
+        last snapshot, along with the states entered by the tasks since,
+        as a ``(workers, tasks, transitions)`` tuple.
+
+        If ``copy`` is true the returned workers and tasks are copies,
+        that can still be written after ``state`` is released.
+
+        """
+        worker_signature = self.get_worker_signature
+        written = self._worker_signatures
+        workers = dict(
+            (hostname, worker) for hostname, worker in items(state.workers)
+            if written.get(hostname, ()) != worker_signature(worker)
+        )
+        if copy:
+            workers = dict((hostname, self.copy_worker(worker))
+                           for hostname, worker in items(workers))
+
+        with self._signature_mutex:
+            return self._take_snapshot(state, workers, copy)
+
+    def _take_snapshot(self, state, workers, copy):
+        signatures, counted, changed, transitions = {}, {}, [], []
+        for uuid, task in items(state.tasks):
+            signature = signatures[uuid] = self.get_task_signature(task)
+            done = self._rollup_counted.get(uuid, {})
+            if self._task_signatures.get(uuid) != signature:
+                if copy:
+                    task = self.copy_task(task, workers)
+                changed.append((uuid, task))
+                if self.rollup:
+                    entered = [(s, t) for s, t in self.get_task_states(task)
+                               if done.get(s) != t]
+                    if entered:
+                        transitions.append((task, entered))
+                        done = dict(done)
+                        done.update(entered)
+            if done:
+                counted[uuid] = done
+        # tasks no longer in the state are forgotten.
+        self._task_signatures = signatures
+        self._rollup_counted = counted
+        return list(items(workers)), changed, transitions
+
+    def copy_worker(self, worker):
+        return type(worker)(hostname=worker.hostname,
+                            heartbeats=list(worker.heartbeats))
+
+    def copy_task(self, task, workers=None):
+        copy = object.__new__(type(task))
+        copy.__dict__.update(task.__dict__)
+        if task.worker is not None:
+            copy.worker = (workers or {}).get(task.worker.hostname) or \
+                self.copy_worker(task.worker)
+        return copy
+
+    def write_snapshot(self, snapshot, commit_every=100):
+        """Store a snapshot returned by :meth:`take_snapshot`.
+
+        If writing fails the tasks of the snapshot are written again
+        by the next one, even if they did not change since.
+
+        """
+        workers, tasks, transitions = snapshot
+        try:
+            self.handle_workers(workers)
+            for i in range(0, len(tasks), commit_every):
+                self.handle_tasks(tasks[i:i + commit_every])
+            if self.rollup:
+                self.handle_rollups(transitions)
+        except Exception:
+            self._forget_snapshot(snapshot)
+            raise
+
+    def _forget_snapshot(self, snapshot):
+        # the signatures are kept when the snapshot is taken, so that
+        # the snapshots waiting to be written in bounded mode are not
+        # counted twice, and are only forgotten if writing fails.
+        _, tasks, transitions = snapshot
+        with self._signature_mutex:
+            for uuid, _ in tasks:
+                self._task_signatures.pop(uuid, None)
+            for task, entered in transitions:
+                done = self._rollup_counted.get(task.uuid)
+                if done:
+                    self._rollup_counted[task.uuid] = dict(
+                        (state, timestamp)
+                        for state, timestamp in items(done)
+                        if (state, timestamp) not in entered
+                    )
+
     def on_shutter(self, state, commit_every=100):
+        """Store the tasks and workers changed since the last shutter.
+
+        The states entered by the tasks since are also counted in the
+        rollups if :attr:`rollup` is enabled.
+
+        """
+        self.write_snapshot(self.take_snapshot(state), commit_every)
+
+    # -- Bounded mode.
+
+    def event(self, event):
+        """Apply ``event`` to the state, flushing early if
+        :attr:`max_buffered_tasks` tasks changed since the last
+        snapshot.  Installed as the event handler of the state
+        in bounded mode."""
+        self.stats['events'] += 1
+        self._state_event(event)
+        uuid = event.get('uuid')
+        if uuid is None or not event.get('type', '').startswith('task-'):
+            return
+        with self._buffer_mutex:
+            if uuid in self._buffered:
+                # written once together with the previous events.
+                self.stats['merged'] += 1
+            else:
+                self._buffered.add(uuid)
+                if len(self._buffered) >= self._buffer_limit:
+                    self._prune_buffered()
+            full = len(self._buffered) >= self.max_buffered_tasks
+        if full and not self._queue.full() and self.capture():
+            self.stats['flushes'] += 1
+
+    def capture(self, block=False):
+        """Take a snapshot of the state.
 
-        def _handle_tasks():
-            for i, task in enumerate(state.tasks.items()):
-                self.handle_task(task)
+        In bounded mode the snapshot is queued for the writer thread
+        instead of being written while the state is frozen.  If the
+        writer is behind and the queue is full the snapshot is skipped,
+        unless ``block`` is true, and the changes are taken by the
+        next one.  Returns true if a snapshot was taken.
 
-        for worker in state.workers.items():
-            self.handle_worker(worker)
-        _handle_tasks()
+        """
+        if not self.max_buffered_tasks:
+            super(Camera, self).capture()
+            return True
+        with self._capture_mutex:
+            if not block:
+                if self._queue.full():
+                    self.stats['skipped'] += 1
+                    return False
+                if self.maxrate is not None and \
+                        not self.maxrate.can_consume():
+                    return False
+            self._queue.put(self.state.freeze_while(
+                self._take_buffered_snapshot, clear_after=self.clear_after,
+            ))
+            return True
+
+    def _prune_buffered(self):
+        # while the writer is behind, forget the tasks evicted from the
+        # state, so that at most twice as many ids as there are tasks in
+        # the state are kept.
+        buffered = set(
+            uuid for uuid in self._buffered if uuid in self.state.tasks
+        )
+        self.stats['dropped'] += len(self._buffered) - len(buffered)
+        self._buffered = buffered
+        self._buffer_limit = 2 * max(len(buffered), self.max_buffered_tasks)
+
+    def _take_buffered_snapshot(self):
+        with self._buffer_mutex:
+            self._prune_buffered()
+            self._buffered = set()
+            self._buffer_limit = 2 * self.max_buffered_tasks
+        self.shutter_signal.send(sender=self.state)
+        return self.take_snapshot(self.state, copy=True)
+
+    def install(self):
+        if self.max_buffered_tasks:
+            self.state.event = self.event
+            self._writer = threading.Thread(
+                target=self._run_writer, name='djcelery.CameraWriter',
+            )
+            self._writer.daemon = True
+            self._writer.start()
+        super(Camera, self).install()
+
+    def cancel(self):
+        if self._writer is None:
+            return super(Camera, self).cancel()
+        for tref in self._tref, self._ctref:
+            if tref:
+                tref.cancel()
+        # flush all received events, then wait for them to be written.
+        self.capture(block=True)
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def _run_writer(self):
+        while True:
+            snapshot = self._queue.get()
+            if snapshot is None:
+                break
+            try:
+                db.close_old_connections()
+                self.write_snapshot(snapshot)
+                self.stats['written'] += 1
+            except Exception as exc:
+                self.stats['failed'] += 1
+                logger.error('Cannot store snapshot: %r', exc, exc_info=True)
+        db.connection.close()
 
     def on_cleanup(self):
+        if self.max_buffered_tasks:
+            logger.info('Cleanup: event stats: %s', ', '.join(
+                '{0}={1}'.format(key, value)
+                for key, value in sorted(items(self.stats))
+            ))
+        if self.rollup:
+            for period in self.rollup_periods:
+                self.TaskRollup.objects.expire(
+                    period, self.expire_rollups.get(period),
+                )
+        if self.cleanup_chunk_size:
+            deleted = self.TaskState.objects.delete_expired_by_states(
+                self.expire_states, self.cleanup_chunk_size,
+                time_limit=self.cleanup_time_limit,
+                progress=self._cleanup_progress,
+            )
+            debug('Cleanup: %s objects purged.', deleted)
+            return deleted
         expired = (self.TaskState.objects.expire_by_states(states, expires)
                    for states, expires in self.expire_states.items())
         dirty = sum(item for item in expired if item is not None)
@@ -141,3 +616,6 @@ class Camera(Polaroid):
             debug('Cleanup: %s objects purged.', dirty)
             return dirty
         return 0
+
+    def _cleanup_progress(self, deleted):
+        debug('Cleanup: %s objects purged so far.', deleted)
@@ -0,0 +1,13 @@
+"""Coroutine helpers for the tests of the asyncio support,
+requiring Python 3.6+."""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+
+
+async def gather(*coroutines):
+    return await asyncio.gather(*coroutines)
+
+
+async def collect(aiterable):
+    return [item async for item in aiterable]
@@ -1,20 +1,29 @@
 from __future__ import absolute_import, unicode_literals
 
 import celery
+import threading
+import time
 
 from datetime import timedelta
 
 from celery import current_app
+from celery import signals
 from celery import states
+from celery.exceptions import TimeoutError
 from celery.result import AsyncResult
 from celery.task import PeriodicTask
 from celery.utils import gen_unique_id
 
+from django.db import transaction
+
 from djcelery.app import app
-from djcelery.backends.database import DatabaseBackend
+from djcelery.backends.database import DatabaseBackend, ResultCache
+from djcelery.backends.notify import PollingListener, PostgresNotifier
 from djcelery.utils import now
 from djcelery.tests.utils import unittest
 
+from .._compat import patch
+
 
 class SomeClass(object):
 
@@ -103,3 +112,253 @@ class TestDatabaseBackend(unittest.TestCase):
 
         b.cleanup()
         self.assertEqual(b.TaskModel._default_manager.count(), 1)
+
+    def test_cleanup_partitioned(self):
+        b = DatabaseBackend(app=app)
+        manager = b.TaskModel._default_manager
+        with patch.object(manager, 'partitioning', return_value='daily'):
+            with patch.object(manager, 'create_partitions',
+                              return_value=[]) as create:
+                with patch.object(manager, 'drop_expired_partitions',
+                                  return_value=[]) as drop:
+                    b.cleanup()
+        # partitions are also created, so they never run out.
+        create.assert_called_once_with()
+        self.assertEqual(drop.call_count, 1)
+
+    def test_buffered_results(self):
+        b = DatabaseBackend(app=app, buffer_size=3, buffer_timeout=60)
+        manager = b.TaskModel._default_manager
+        ids = [gen_unique_id() for _ in range(3)]
+
+        b.mark_as_started(ids[0])
+        b.mark_as_done(ids[0], 42)
+        self.assertEqual(len(b.result_buffer), 1)
+        self.assertFalse(manager.filter(task_id=ids[0]).exists())
+
+        # reading a buffered result flushes it first.
+        self.assertEqual(b.get_status(ids[0]), states.SUCCESS)
+        self.assertEqual(len(b.result_buffer), 0)
+        self.assertEqual(manager.get(task_id=ids[0]).result, 42)
+
+        # flushed when the buffer is full.
+        for i, task_id in enumerate(ids):
+            b.mark_as_done(task_id, i)
+        self.assertEqual(len(b.result_buffer), 0)
+        self.assertEqual(manager.get(task_id=ids[2]).result, 2)
+
+        # flushed when the worker shuts down.
+        b.mark_as_done(ids[1], 'last')
+        signals.worker_process_shutdown.send(sender=None)
+        self.assertEqual(manager.get(task_id=ids[1]).result, 'last')
+
+    def test_buffered_forget(self):
+        b = DatabaseBackend(app=app, buffer_size=10, buffer_timeout=60)
+        tid = gen_unique_id()
+        b.mark_as_done(tid, 42)
+        b.forget(tid)
+        self.assertEqual(b.flush(), 0)
+        self.assertEqual(b.get_status(tid), states.PENDING)
+
+    def test_get_many(self):
+        b = DatabaseBackend(app=app)
+        b.get_many_chunk_size = 2
+        ids = [gen_unique_id() for _ in range(3)]
+        for i, task_id in enumerate(ids):
+            b.mark_as_done(task_id, i)
+
+        metas = b._get_task_meta_for_many(ids + ['xxx-unknown'])
+        self.assertEqual(metas['xxx-unknown']['status'], states.PENDING)
+        self.assertEqual(metas[ids[1]]['result'], 1)
+
+        results = dict(b.get_many(ids, interval=0.01))
+        self.assertEqual(set(results), set(ids))
+        self.assertEqual(results[ids[2]]['result'], 2)
+        self.assertEqual(results[ids[0]]['status'], states.SUCCESS)
+
+        pending = gen_unique_id()
+        results = dict(b.get_many([ids[0], pending],
+                                  interval=0.01, max_iterations=2))
+        self.assertEqual(list(results), [ids[0]])
+
+    def test_cleanup_chunked(self):
+        b = DatabaseBackend(app=app)
+        manager = b.TaskModel._default_manager
+        manager.all().delete()
+        ids = [gen_unique_id() for _ in range(5)]
+        for i, task_id in enumerate(ids):
+            b.mark_as_done(task_id, i)
+        then = now() - current_app.conf.CELERY_TASK_RESULT_EXPIRES * 2
+        manager.filter(task_id__in=ids[:-1]).update(date_done=then)
+
+        progress = []
+        deleted = manager.delete_expired(
+            current_app.conf.CELERY_TASK_RESULT_EXPIRES, chunk_size=2,
+            max_rows=3, progress=progress.append,
+        )
+        self.assertEqual(deleted, 3)
+        self.assertEqual(progress, [2, 3])
+        self.assertEqual(manager.count(), 2)
+
+        deleted = manager.delete_expired(
+            current_app.conf.CELERY_TASK_RESULT_EXPIRES, chunk_size=2,
+        )
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(manager.values_list('task_id', flat=True)),
+                         ids[-1:])
+
+    def test_get_state(self):
+        b = DatabaseBackend(app=app, buffer_size=10, buffer_timeout=60)
+        manager = b.TaskModel._default_manager
+        tid = gen_unique_id()
+        self.assertEqual(b.get_state(tid), states.PENDING)
+        self.assertEqual(manager.get_task_state(tid, None), None)
+
+        b.mark_as_started(tid)
+        self.assertEqual(b.get_state(tid), states.STARTED)
+        b.mark_as_done(tid, 'x' * 4096)
+        self.assertEqual(b.get_status(tid), states.SUCCESS)
+        self.assertEqual(manager.get_task_state(tid), states.SUCCESS)
+
+    def test_result_cache(self):
+        b = DatabaseBackend(app=app, cache_max=10, cache_alias='default')
+        manager = b.TaskModel._default_manager
+        tid, pending = gen_unique_id(), gen_unique_id()
+        b.mark_as_started(tid)
+        self.assertIsNone(b.result_cache.get(tid))
+        b.mark_as_done(tid, 42)
+        self.assertEqual(b.result_cache.get(tid)['result'], 42)
+
+        # ready results are served from the cache from now on.
+        manager.filter(task_id=tid).update(status=states.FAILURE)
+        self.assertEqual(b.get_task_meta(tid, cache=False)['result'], 42)
+        self.assertEqual(b.get_state(tid), states.SUCCESS)
+        metas = b._get_task_meta_for_many([tid, pending])
+        self.assertEqual(metas[tid]['status'], states.SUCCESS)
+        self.assertEqual(metas[pending]['status'], states.PENDING)
+        self.assertIsNone(b.result_cache.get(pending))
+
+        # shared with other processes through the Django cache.
+        other = DatabaseBackend(app=app, cache_alias='default')
+        self.assertEqual(other.get_task_meta(tid, cache=False)['result'], 42)
+
+        b.forget(tid)
+        self.assertIsNone(b.result_cache.get(tid))
+        self.assertIsNone(other.result_cache.get(tid))
+        self.assertEqual(b.get_state(tid), states.PENDING)
+
+        # local entries expire like the shared ones.
+        cache = ResultCache(limit=10, timeout=0)
+        cache.set(tid, {'result': 42})
+        self.assertIsNone(cache.get(tid))
+
+    def test_pending_cache(self):
+        b = DatabaseBackend(app=app, pending_ttl=60)
+        manager = b.TaskModel._default_manager
+        tid = gen_unique_id()
+        self.assertEqual(b.get_state(tid), states.PENDING)
+        self.assertIn(tid, b.pending_cache)
+        first_ttl = b.pending_cache.entries[tid][1]
+
+        # stored by another process: not seen until the entry expires.
+        manager.store_result(tid, 42, states.SUCCESS)
+        self.assertEqual(b.get_task_meta(tid, cache=False)['status'],
+                         states.PENDING)
+        self.assertEqual(b._get_task_meta_for_many([tid])[tid]['status'],
+                         states.PENDING)
+        b.pending_cache.entries[tid] = (0, first_ttl)
+        self.assertEqual(b.get_state(tid), states.SUCCESS)
+        self.assertNotIn(tid, b.pending_cache)
+
+        # backs off on consecutive misses.
+        tid2 = gen_unique_id()
+        b.get_state(tid2)
+        b.pending_cache.entries[tid2] = (0, first_ttl)
+        b.get_state(tid2)
+        self.assertEqual(b.pending_cache.entries[tid2][1], first_ttl * 2)
+
+        # stored by this process.
+        b.mark_as_done(tid2, 42)
+        self.assertEqual(b.get_state(tid2), states.SUCCESS)
+
+    def test_notify(self):
+        b = DatabaseBackend(app=app, notify=True, pending_ttl=60)
+        b.notify_poll_interval = 30
+        tid = gen_unique_id()
+        self.assertEqual(b.get_state(tid), states.PENDING)
+        # stored by another process, only seen once notified.
+        b.TaskModel._default_manager.store_result(tid, 42, states.SUCCESS)
+        timer = threading.Timer(0.2, b._notify, ([tid], ))
+        timer.start()
+        started = time.time()
+        try:
+            meta = b.wait_for(tid, timeout=10)
+        finally:
+            timer.cancel()
+        self.assertEqual(meta['result'], 42)
+        self.assertLess(time.time() - started, 5)
+
+        with self.assertRaises(TimeoutError):
+            b.wait_for(gen_unique_id(), timeout=0.1)
+
+    def test_notify_interval(self):
+        b = DatabaseBackend(app=app, notify=True)
+        with b.listener() as listener:
+            self.assertEqual(b.listener_interval(listener, 0.5),
+                             b.notify_poll_interval)
+        # keeps polling at the given interval if nothing can be received.
+        self.assertEqual(b.listener_interval(PollingListener(), 0.5), 0.5)
+        notifier = PostgresNotifier(b.TaskModel._default_manager)
+        with transaction.atomic():
+            self.assertFalse(notifier.listener().receives)
+
+    @unittest.skipUnless(hasattr(DatabaseBackend, 'aget_task_meta'),
+                         'asyncio support not available')
+    def test_async_api(self):
+        from asgiref.sync import async_to_sync
+        b = DatabaseBackend(app=app)
+        tid = gen_unique_id()
+        self.assertEqual(async_to_sync(b.aget_state)(tid), states.PENDING)
+        b.mark_as_done(tid, 42)
+        self.assertEqual(async_to_sync(b.aget_task_meta)(tid)['result'], 42)
+        meta = async_to_sync(b.async_wait_for)(tid, timeout=1)
+        self.assertEqual(meta['status'], states.SUCCESS)
+        with self.assertRaises(TimeoutError):
+            async_to_sync(b.async_wait_for)(
+                gen_unique_id(), timeout=0.1, interval=0.01,
+            )
+
+    @unittest.skipUnless(hasattr(DatabaseBackend, 'aget_task_meta'),
+                         'asyncio support not available')
+    def test_async_notify(self):
+        from asgiref.sync import async_to_sync
+        from djcelery.tests.aio_utils import gather
+        b = DatabaseBackend(app=app, notify=True, pending_ttl=60)
+        b.notify_poll_interval = 30
+        tids = [gen_unique_id() for i in range(3)]
+        for tid in tids:
+            self.assertEqual(b.get_state(tid), states.PENDING)
+            # stored by another process, only seen once notified.
+            b.TaskModel._default_manager.store_result(tid, 42, states.SUCCESS)
+        listeners = []
+
+        def listener(shared=False):
+            listeners.append(notifier_listener(shared=shared))
+            return listeners[-1]
+        notifier_listener = b.notifier.listener
+        timer = threading.Timer(0.2, b._notify, (tids, ))
+        timer.start()
+        started = time.time()
+        try:
+            with patch.object(b.notifier, 'listener', listener):
+                metas = async_to_sync(gather)(*[
+                    b.async_wait_for(tid, timeout=10) for tid in tids
+                ])
+        finally:
+            timer.cancel()
+            for shared_listener in listeners:
+                shared_listener.close()
+        self.assertEqual([meta['result'] for meta in metas], [42] * 3)
+        self.assertLess(time.time() - started, 5)
+        # a single listener is shared by all waiters.
+        self.assertEqual(len(listeners), 1)
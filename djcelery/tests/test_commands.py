@@ -1,6 +1,7 @@
 # coding: utf-8
 from django import VERSION
-from django.core.management import execute_from_command_line
+from django.core.management import call_command, execute_from_command_line
+from django.core.management.base import CommandError
 
 from ._compat import patch
 
@@ -30,3 +31,12 @@ def test_celeryd_command():
             verbosity=1, without_gossip=False, without_heartbeat=False,
             without_mingle=False, working_directory=None
         )
+
+
+def test_djcelerypartitions_not_partitioned():
+    try:
+        call_command('djcelerypartitions')
+    except CommandError:
+        pass
+    else:
+        raise AssertionError('CommandError not raised')
@@ -2,10 +2,33 @@ from __future__ import absolute_import, unicode_literals
 
 from celery import loaders
 
+from django.test.utils import override_settings
+
 from djcelery import loaders as djloaders
 from djcelery.app import app
 from djcelery.tests.utils import unittest
 
+from ._compat import patch
+
+
+class FakeConnection(object):
+    alias = 'default'
+    close_at = 0
+
+    def __init__(self):
+        self.connection = object()
+        self.usable = True
+
+    def close_if_unusable_or_obsolete(self):
+        if not self.usable:
+            self.close()
+
+    def is_usable(self):
+        return self.usable
+
+    def close(self):
+        self.connection = None
+
 
 class TestDjangoLoader(unittest.TestCase):
 
@@ -29,6 +52,31 @@ class TestDjangoLoader(unittest.TestCase):
         finally:
             settings.CELERY_IMPORTS = old_imports
 
+    @override_settings(CELERY_DB_REUSE_POLICY='health',
+                       CELERY_DB_REUSE_MAX_TASKS=2)
+    def test_recycle_database(self):
+        conn = FakeConnection()
+        with patch('djcelery.loaders.db') as db:
+            db.connections.all.return_value = [conn]
+            self.loader.close_database(new_task=True)
+            self.loader.close_database(new_task=True)
+            self.assertIsNotNone(conn.connection)
+            self.assertIsNone(conn.close_at)
+            # closed after CELERY_DB_REUSE_MAX_TASKS tasks.
+            self.loader.close_database(new_task=True)
+            self.assertIsNone(conn.connection)
+
+            conn.connection = object()
+            conn.usable = False
+            self.loader.close_database()
+            self.assertIsNone(conn.connection)
+
+        stats = self.loader.db_stats
+        self.assertEqual(stats['connects'], 2)
+        self.assertEqual(stats['reuses'], 2)
+        self.assertEqual(stats['closed_tasks'], 1)
+        self.assertEqual(stats['closed_unusable'], 1)
+
     def test_race_protection(self):
         djloaders._RACE_PROTECTION = True
         try:
@@ -5,12 +5,56 @@ from datetime import datetime, timedelta
 from celery import states
 from celery.utils import gen_unique_id
 
+from django.test.utils import override_settings
+
 from djcelery import celery
-from djcelery.models import TaskMeta, TaskSetMeta
+from djcelery.metrics import RuntimeSketch, period_start
+from djcelery.models import TaskMeta, TaskRollup, TaskSetMeta
+from djcelery.picklefield import (
+    CODEC_HEADER, LazyPickledValue, codecs,
+    decode_binary, encode, encode_binary,
+)
 from djcelery.utils import now
 from djcelery.tests.utils import unittest
 from djcelery.compat import unicode
 
+from ._compat import patch
+
+
+class FakeCursor(object):
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+
+class FakeOperations(object):
+
+    def quote_name(self, name):
+        return '"{0}"'.format(name)
+
+    def adapt_datetimefield_value(self, value):
+        return str(value)
+
+
+class FakeConnection(object):
+
+    def __init__(self, vendor):
+        self.vendor = vendor
+        self.ops = FakeOperations()
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
 
 class TestModels(unittest.TestCase):
 
@@ -56,6 +100,8 @@ class TestModels(unittest.TestCase):
         self.assertIn(m1, expired)
         self.assertNotIn(m2, expired)
         self.assertNotIn(m3, expired)
+        active = list(TaskMeta.objects.active())
+        self.assertLess(active.index(m2), active.index(m1))
 
         TaskMeta.objects.delete_expired(
             celery.conf.CELERY_TASK_RESULT_EXPIRES,
@@ -100,3 +146,204 @@ class TestModels(unittest.TestCase):
 
         TaskSetMeta.objects.delete_taskset(m4.taskset_id)
         self.assertIsNone(TaskSetMeta.objects.restore_taskset(m4.taskset_id))
+
+    def test_taskmeta_store_result_upsert(self):
+        m1 = self.createTaskMeta()
+        manager = TaskMeta.objects
+        if not manager.supports_upsert():
+            raise unittest.SkipTest('database does not support upsert')
+        self.assertIsNone(
+            manager.store_result(m1.task_id, 1, status=states.STARTED),
+        )
+        manager.store_result(m1.task_id, 2, status=states.SUCCESS,
+                             children=[('a', None)])
+        self.assertEqual(manager.filter(task_id=m1.task_id).count(), 1)
+        stored = manager.get_task(m1.task_id)
+        self.assertEqual(stored.pk, m1.pk)
+        self.assertEqual(stored.status, states.SUCCESS)
+        self.assertEqual(stored.result, 2)
+        self.assertEqual(stored.meta, {'children': [('a', None)]})
+        self.assertGreaterEqual(stored.date_done, m1.date_done)
+
+        tid = gen_unique_id()
+        manager.store_result(tid, 3, status=states.SUCCESS)
+        self.assertEqual(manager.get_task(tid).result, 3)
+
+    def test_taskmeta_store_result_without_upsert(self):
+        m1 = self.createTaskMeta()
+        manager = TaskMeta.objects
+        prev, manager.supports_upsert = manager.supports_upsert, lambda: False
+        try:
+            self.assertIsNone(
+                manager.store_result(m1.task_id, 4, status=states.SUCCESS),
+            )
+        finally:
+            manager.supports_upsert = prev
+        self.assertEqual(manager.get_task(m1.task_id).result, 4)
+
+    def test_taskmeta_partitioning(self):
+        manager = TaskMeta.objects
+        self.assertIsNone(manager.partitioning())
+        with override_settings(CELERY_RESULT_DB_PARTITION='weekly'):
+            self.assertRaises(ValueError, manager.partitioning)
+        with override_settings(CELERY_RESULT_DB_PARTITION='hourly',
+                               USE_TZ=False):
+            self.assertEqual(manager.partitioning(), 'hourly')
+            self.assertFalse(manager.supports_upsert())
+            self.assertEqual(
+                manager._partition_name(datetime(2026, 10, 18, 7),
+                                        '%Y%m%d%H'),
+                'celery_taskmeta_p2026101807',
+            )
+            if manager.connection_for_write().vendor == 'sqlite':
+                self.assertRaises(NotImplementedError,
+                                  manager.get_partitions)
+
+    @override_settings(CELERY_RESULT_DB_PARTITION='daily', USE_TZ=False)
+    def test_taskmeta_partition_sql(self):
+        manager = TaskMeta.objects
+        nowfun = lambda: datetime(2026, 10, 18, 7, 30)  # noqa
+        existing = {'celery_taskmeta_p20261010': datetime(2026, 10, 10),
+                    'celery_taskmeta_p20261018': datetime(2026, 10, 18)}
+        expected = {
+            'postgresql': [
+                ('CREATE TABLE IF NOT EXISTS "celery_taskmeta_p20261019" '
+                 'PARTITION OF "celery_taskmeta" FOR VALUES FROM (%s) TO (%s)',
+                 [datetime(2026, 10, 19), datetime(2026, 10, 20)]),
+                ('CREATE TABLE IF NOT EXISTS "celery_taskmeta_p20261020" '
+                 'PARTITION OF "celery_taskmeta" FOR VALUES FROM (%s) TO (%s)',
+                 [datetime(2026, 10, 20), datetime(2026, 10, 21)]),
+                ('DROP TABLE IF EXISTS "celery_taskmeta_p20261010"', None),
+            ],
+            'mysql': [
+                ('ALTER TABLE "celery_taskmeta" ADD PARTITION (PARTITION '
+                 '"celery_taskmeta_p20261019" VALUES LESS THAN (%s))',
+                 ['2026-10-20 00:00:00']),
+                ('ALTER TABLE "celery_taskmeta" ADD PARTITION (PARTITION '
+                 '"celery_taskmeta_p20261020" VALUES LESS THAN (%s))',
+                 ['2026-10-21 00:00:00']),
+                ('ALTER TABLE "celery_taskmeta" '
+                 'DROP PARTITION "celery_taskmeta_p20261010"', None),
+            ],
+        }
+        for vendor, statements in expected.items():
+            conn = FakeConnection(vendor)
+            with patch.object(manager, 'connection_for_write',
+                              return_value=conn):
+                with patch.object(manager, 'get_partitions',
+                                  return_value=existing):
+                    self.assertEqual(
+                        manager.create_partitions(2, nowfun=nowfun),
+                        ['celery_taskmeta_p20261019',
+                         'celery_taskmeta_p20261020'],
+                    )
+                    self.assertEqual(
+                        manager.drop_expired_partitions(timedelta(days=3),
+                                                        nowfun=nowfun),
+                        ['celery_taskmeta_p20261010'],
+                    )
+            self.assertEqual(conn.executed, statements)
+
+    def test_binary_pickled_results(self):
+        value = {'foo': [1, 2, 3], 'bar': 'baz'}
+        for compress in (False, True):
+            self.assertEqual(
+                decode_binary(encode_binary(value, compress), compress),
+                value,
+            )
+            # values written before the migration to binary columns.
+            legacy = encode(value, compress)
+            self.assertEqual(decode_binary(legacy, compress), value)
+            self.assertEqual(decode_binary(memoryview(legacy.encode()),
+                                           compress), value)
+
+        m1 = self.createTaskMeta()
+        TaskMeta.objects.store_result(m1.task_id, value, states.SUCCESS)
+        self.assertEqual(TaskMeta.objects.get_task(m1.task_id).result, value)
+
+    def test_compression_codecs(self):
+        small, large = 'x', 'x' * 4096
+        for name in codecs:
+            for compress in (False, True):
+                for value in (small, large):
+                    data = encode_binary(value, compress, codec=name,
+                                         min_size=1024)
+                    self.assertEqual(decode_binary(data, compress), value)
+                    self.assertEqual(decode_binary(data), value)
+        # small values are not compressed, but marked as such
+        # if the field is compressed.
+        self.assertNotEqual(encode_binary(small, False, min_size=1024)[:2],
+                            CODEC_HEADER)
+        data = encode_binary(small, True, min_size=1024)
+        self.assertEqual(data[:3], CODEC_HEADER + codecs['none'].id)
+        data = encode_binary(large, False, codec='zlib', min_size=1024)
+        self.assertEqual(data[:3], CODEC_HEADER + codecs['zlib'].id)
+        self.assertLess(len(data), 1024)
+        # unavailable codecs fall back to zlib.
+        data = encode_binary(large, True, codec='xxx-unknown')
+        self.assertEqual(data[:3], CODEC_HEADER + codecs['zlib'].id)
+
+    def test_lazy_pickled_results(self):
+        m1 = self.createTaskMeta()
+        TaskMeta.objects.store_result(m1.task_id, {'foo': 'bar'},
+                                      states.SUCCESS, children=[1])
+        stored = TaskMeta.objects.get(task_id=m1.task_id)
+        if not TaskMeta._meta.get_field('result').lazy:
+            raise unittest.SkipTest('lazy fields require Django 3.0')
+        self.assertIsInstance(stored.__dict__['result'], LazyPickledValue)
+        self.assertIsInstance(stored.__dict__['meta'], LazyPickledValue)
+
+        # saved back without decoding.
+        stored.status = states.FAILURE
+        stored.save()
+        self.assertIsInstance(stored.__dict__['result'], LazyPickledValue)
+
+        stored = TaskMeta.objects.get(task_id=m1.task_id)
+        self.assertEqual(stored.status, states.FAILURE)
+        self.assertEqual(stored.result, {'foo': 'bar'})
+        self.assertEqual(stored.__dict__['result'], {'foo': 'bar'})
+        self.assertEqual(stored.meta, {'children': [1]})
+
+        # decoded without a model instance too.
+        results = TaskMeta.objects.filter(task_id=m1.task_id)
+        self.assertEqual(list(results.values_list('result', flat=True)),
+                         [{'foo': 'bar'}])
+        self.assertEqual(list(results.values('result', 'meta')),
+                         [{'result': {'foo': 'bar'},
+                           'meta': {'children': [1]}}])
+
+    def test_taskrollup(self):
+        start = period_start('minute', 1500000000.0)
+        self.assertEqual(period_start('minute', 1500000059.0), start)
+
+        def rollup(runtimes):
+            obj = TaskRollup(period='minute', start=start,
+                             name='djcelery.unittest.rollup',
+                             state=states.SUCCESS)
+            for runtime in runtimes:
+                obj.add(runtime)
+            return obj
+
+        TaskRollup.objects.record([rollup([0.5] * 50)])
+        TaskRollup.objects.record([rollup([2.0] * 50), rollup([None])])
+        stored = TaskRollup.objects.get(name='djcelery.unittest.rollup')
+        self.assertEqual(stored.count, 101)
+        self.assertEqual(stored.runtime_count, 100)
+        self.assertAlmostEqual(stored.runtime_avg, 1.25)
+        self.assertAlmostEqual(stored.runtime_quantile(0.25), 0.5, delta=0.005)
+        self.assertAlmostEqual(stored.runtime_quantile(0.99), 2.0, delta=0.02)
+        self.assertEqual(
+            TaskRollup.objects.runtime_sketch(name=stored.name),
+            stored.sketch,
+        )
+
+        sketch = RuntimeSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        sketch.add(0)
+        self.assertEqual(RuntimeSketch.loads(sketch.dumps()), sketch)
+
+        self.assertEqual(TaskRollup.objects.expire('minute', None), None)
+        self.assertEqual(
+            TaskRollup.objects.expire('minute', timedelta(days=1)), 1,
+        )
+        self.assertFalse(TaskRollup.objects.filter(pk=stored.pk).exists())
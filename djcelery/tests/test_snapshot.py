@@ -9,7 +9,8 @@ from celery.events import Event as _Event
 from celery.events.state import State, Worker, Task
 from celery.utils import gen_unique_id
 
-from django.test.utils import override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils import timezone
 
 from djcelery import celery
@@ -19,6 +20,8 @@ from djcelery.utils import make_aware
 from djcelery.tests.utils import unittest
 from djcelery.compat import unicode
 
+from ._compat import patch
+
 
 _ids = count(0)
 _clock = count(1)
@@ -188,6 +191,19 @@ class test_Camera(unittest.TestCase):
     def test_on_cleanup_does_not_expire_new(self, dec=0):
         self.assertExpires(dec, 0)
 
+    def test_on_cleanup_unchunked(self, dec=332000):
+        self.cam.cleanup_chunk_size = None
+        self.assertExpires(dec, 10)
+
+    def test_on_cleanup_time_limit(self, dec=332000):
+        self.cam.on_cleanup()
+        self.cam.cleanup_chunk_size = 3
+        self.cam.cleanup_time_limit = 0
+        # stops after the first chunk.
+        self.assertExpires(dec, 3)
+        self.cam.cleanup_time_limit = None
+        self.assertEqual(self.cam.on_cleanup(), 7)
+
     def test_on_shutter(self):
         state = self.state
         cam = self.cam
@@ -248,3 +264,204 @@ class test_Camera(unittest.TestCase):
         self.assertEqual(t2.worker.hostname, ws[1])
 
         cam.on_shutter(state)
+
+    def test_on_shutter_batched(self):
+        state = self.state
+        uus = [gen_unique_id() for i in range(25)]
+        for uuid in uus:
+            state.event(Event('task-received', uuid=uuid, name='A',
+                              args='(2, 2)', hostname='worker1.ex.com'))
+        with CaptureQueriesContext(connection) as queries:
+            self.cam.on_shutter(state, commit_every=10)
+        # one lookup and one write per chunk, at most.
+        task_queries = [q for q in queries.captured_queries
+                        if 'celery_taskstate' in q['sql']]
+        self.assertLessEqual(len(task_queries), 6)
+        self.assertEqual(
+            models.TaskState.objects.filter(task_id__in=uus).count(), 25,
+        )
+
+        state.event(Event('task-succeeded', uuid=uus[0], result=42,
+                          hostname='worker1.ex.com'))
+        state.event(Event('task-started', uuid=uus[1],
+                          hostname='worker1.ex.com'))
+        stored = self.cam.handle_tasks([(uuid, state.tasks[uuid])
+                                        for uuid in uus[:2]])
+        self.assertEqual(len(stored), 2)
+        t1 = models.TaskState.objects.get(task_id=uus[0])
+        self.assertEqual(t1.state, states.SUCCESS)
+        self.assertEqual(t1.result, '42')
+        self.assertEqual(t1.args, '(2, 2)')
+        self.assertEqual(t1.worker.hostname, 'worker1.ex.com')
+        t2 = models.TaskState.objects.get(task_id=uus[1])
+        self.assertEqual(t2.state, states.STARTED)
+
+    def test_on_shutter_workers_batched(self):
+        state = self.state
+        ws = ['worker%s.ex.com' % i for i in range(10)]
+        uus = [gen_unique_id() for i in range(10)]
+        for hostname, uuid in zip(ws, uus):
+            state.event(Event('worker-online', hostname=hostname,
+                              local_received=time()))
+            state.event(Event('task-received', uuid=uuid, name='A',
+                              hostname=hostname))
+        with CaptureQueriesContext(connection) as queries:
+            self.cam.on_shutter(state)
+        # the number of queries does not depend on the number of workers.
+        worker_queries = [q for q in queries.captured_queries
+                          if 'celery_workerstate' in q['sql']]
+        self.assertLessEqual(len(worker_queries), 4)
+        for hostname, uuid in zip(ws, uus):
+            worker = models.WorkerState.objects.get(hostname=hostname)
+            self.assertTrue(worker.is_alive())
+            self.assertEqual(
+                models.TaskState.objects.get(task_id=uuid).worker_id,
+                worker.pk,
+            )
+
+    def test_on_shutter_failed(self):
+        state = self.state
+        uuid = gen_unique_id()
+        state.event(Event('task-received', uuid=uuid, name='F',
+                          hostname='worker1.ex.com'))
+        with patch.object(self.cam, 'handle_tasks', side_effect=KeyError()):
+            with self.assertRaises(KeyError):
+                self.cam.on_shutter(state)
+        # written by the next shutter, although it did not change.
+        self.cam.on_shutter(state)
+        self.assertTrue(
+            models.TaskState.objects.filter(task_id=uuid).exists(),
+        )
+
+    def test_on_shutter_rollup(self):
+        state = self.state
+        self.cam.rollup = True
+        uus = [gen_unique_id() for i in range(3)]
+        for uuid in uus:
+            state.event(Event('task-received', uuid=uuid, name='R',
+                              hostname='worker1.ex.com'))
+        self.cam.on_shutter(state)
+        # unchanged tasks are not counted again.
+        self.cam.on_shutter(state)
+        for uuid in uus[:2]:
+            state.event(Event('task-succeeded', uuid=uuid, runtime=0.1,
+                              hostname='worker1.ex.com'))
+        # every state entered between two shutters is counted.
+        short = gen_unique_id()
+        for type in ('task-received', 'task-started', 'task-succeeded'):
+            state.event(Event(type, uuid=short, name='R', runtime=0.1,
+                              hostname='worker1.ex.com'))
+        self.cam.on_shutter(state)
+
+        def counts(period):
+            rollups = models.TaskRollup.objects.filter(name='R',
+                                                       period=period)
+            return dict((state, sum(r.count for r in rollups
+                                    if r.state == state))
+                        for state in (states.RECEIVED, states.STARTED,
+                                      states.SUCCESS))
+
+        for period in ('minute', 'hour'):
+            self.assertEqual(counts(period), {states.RECEIVED: 4,
+                                              states.STARTED: 1,
+                                              states.SUCCESS: 3})
+        sketch = models.TaskRollup.objects.runtime_sketch(
+            name='R', period='hour',
+        )
+        self.assertEqual(len(sketch), 3)
+        self.assertAlmostEqual(sketch.quantile(0.5), 0.1, delta=0.002)
+
+    def test_bounded_stalled(self):
+        state = State(max_tasks_in_memory=5)
+        cam = self.Camera(state)
+        cam.max_buffered_tasks = 2
+        with patch.object(cam, 'shutter_signal') as shutter_signal:
+            while cam.capture():
+                pass
+            shutter_signal.send.assert_called_with(sender=state)
+        # the writer is stalled, only the ids of the tasks still in
+        # the state are kept.
+        for i in range(50):
+            cam.event(Event('task-received', uuid=gen_unique_id(), name='S',
+                            hostname='worker1.ex.com'))
+        self.assertLessEqual(len(cam._buffered), 10)
+        self.assertGreater(cam.stats['dropped'], 0)
+
+    def test_bounded(self):
+        cam = self.cam
+        cam.max_buffered_tasks = 3
+        uus = [gen_unique_id() for i in range(3)]
+        for uuid in uus[:2]:
+            cam.event(Event('task-received', uuid=uuid, name='B',
+                            hostname='worker1.ex.com'))
+        cam.event(Event('task-started', uuid=uus[0],
+                        hostname='worker1.ex.com'))
+        self.assertTrue(cam._queue.empty())
+        cam.event(Event('task-received', uuid=uus[2], name='B',
+                        hostname='worker1.ex.com'))
+        # flushed early as the third task changed.
+        self.assertEqual(cam._queue.qsize(), 1)
+        self.assertEqual(cam.stats['events'], 4)
+        self.assertEqual(cam.stats['merged'], 1)
+        self.assertEqual(cam.stats['flushes'], 1)
+
+        # the snapshot is a copy, not changed by later events.
+        cam.event(Event('task-succeeded', uuid=uus[0], result=42,
+                        hostname='worker1.ex.com'))
+        workers, tasks, _ = snapshot = cam._queue.get()
+        self.assertEqual(len(tasks), 3)
+        cam.write_snapshot(snapshot)
+        self.assertEqual(models.TaskState.objects.get(task_id=uus[0]).state,
+                         states.STARTED)
+
+        # the writer is behind, the changes are taken by a later snapshot.
+        self.assertTrue(cam.capture())
+        cam.event(Event('task-failed', uuid=uus[1],
+                        hostname='worker1.ex.com'))
+        self.assertTrue(cam.capture())
+        self.assertFalse(cam.capture())
+        self.assertEqual(cam.stats['skipped'], 1)
+        while not cam._queue.empty():
+            cam.write_snapshot(cam._queue.get())
+        self.assertEqual(models.TaskState.objects.get(task_id=uus[0]).state,
+                         states.SUCCESS)
+        self.assertEqual(models.TaskState.objects.get(task_id=uus[1]).state,
+                         states.FAILURE)
+
+    def test_bounded_writer(self):
+        cam = self.Camera(State(), freq=3600)
+        cam.max_buffered_tasks = 10
+        cam.install()
+        try:
+            self.assertEqual(cam.state.event, cam.event)
+            self.assertTrue(cam._writer.is_alive())
+        finally:
+            cam.cancel()
+        self.assertIsNone(cam._writer)
+        self.assertEqual(cam.stats['written'], 1)
+
+    def test_on_shutter_only_changed(self):
+        state = self.state
+        uus = [gen_unique_id() for i in range(3)]
+        for uuid in uus:
+            state.event(Event('task-received', uuid=uuid, name='A',
+                              hostname='worker1.ex.com'))
+        self.cam.on_shutter(state)
+
+        def written():
+            with CaptureQueriesContext(connection) as queries:
+                self.cam.on_shutter(state)
+            tables = ('celery_taskstate', 'celery_workerstate')
+            return [q for q in queries.captured_queries
+                    if any(table in q['sql'] for table in tables)]
+
+        self.assertEqual(written(), [])
+        state.event(Event('task-started', uuid=uus[0],
+                          hostname='worker1.ex.com'))
+        self.cam._last_worker_write.clear()
+        self.assertTrue(written())
+        self.assertEqual(
+            models.TaskState.objects.get(task_id=uus[0]).state,
+            states.STARTED,
+        )
+        self.assertEqual(written(), [])
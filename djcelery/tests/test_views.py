@@ -7,6 +7,7 @@ from functools import partial
 from billiard.einfo import ExceptionInfo
 
 from django.http import HttpResponse
+from django.test import RequestFactory
 from django.test.testcases import TestCase as DjangoTestCase
 from django.template import TemplateDoesNotExist
 
@@ -17,8 +18,12 @@ from celery import states
 from celery.task import task
 from celery.utils import gen_unique_id, get_full_cls_name
 
+from djcelery import views
 from djcelery.views import task_webhook
 from djcelery.tests.req import MockRequest
+from djcelery.tests.utils import unittest
+
+from ._compat import patch
 
 try:
     from django.urls import reverse  # Django 1.10+
@@ -46,6 +51,9 @@ task_is_successful = partial(reversestar, 'celery-is_task_successful')
 task_status = partial(reversestar, 'celery-task_status')
 task_apply = partial(reverse, 'celery-apply')
 registered_tasks = partial(reverse, 'celery-tasks')
+tasks_status = partial(reverse, 'celery-tasks_status')
+task_wait = partial(reversestar, 'celery-task_wait')
+tasks_events = partial(reverse, 'celery-tasks_events')
 scratch = {}
 
 
@@ -125,6 +133,57 @@ class test_registered_tasks(ViewTestCase):
         tasks = loads(json.content.decode('utf-8'))
         self.assertIn('celery.backend_cleanup', tasks['regular'])
 
+    def test_registered_tasks_cached(self):
+        self.assertIs(views.get_registered_tasks(),
+                      views.get_registered_tasks())
+        response = self.client.get(registered_tasks())
+        self.assertEqual(
+            self.client.get(registered_tasks(),
+                            HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            304,
+        )
+        self.assertEqual(
+            self.client.get(
+                registered_tasks(),
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            ).status_code,
+            304,
+        )
+
+    def test_registered_tasks_replaced(self):
+        before = views.get_registered_tasks()
+        name = before.names[0]
+        with patch.dict(views.tasks):
+            # same number of tasks, with different names.
+            views.tasks['djcelery.unittest.replaced'] = views.tasks.pop(name)
+            after = views.get_registered_tasks()
+        self.assertNotEqual(after.etag, before.etag)
+        self.assertIn('djcelery.unittest.replaced', after.names)
+        self.assertNotIn(name, after.names)
+
+    def test_registered_tasks_filter(self):
+        response = self.client.get(registered_tasks(),
+                                   {'q': 'CELERY.', 'limit': 2})
+        tasks = loads(response.content.decode('utf-8'))
+        self.assertEqual(len(tasks['regular']), 2)
+        self.assertGreater(tasks['count'], 2)
+        self.assertTrue(all(name.startswith('celery.')
+                            for name in tasks['regular']))
+        response = self.client.get(registered_tasks(),
+                                   {'q': 'celery.', 'offset': 1, 'limit': 1})
+        self.assertEqual(loads(response.content.decode('utf-8'))['regular'],
+                         tasks['regular'][1:2])
+        response = self.client.get(registered_tasks(), {'limit': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_dumps(self):
+        self.assertEqual(loads(views.json_dumps({'b': [1], 'a': None},
+                                                sort_keys=True)),
+                         {'a': None, 'b': [1]})
+        # values the fast encoders reject are encoded by json.
+        self.assertEqual(loads(views.json_dumps({1: 2 ** 70})),
+                         {'1': 2 ** 70})
+
 
 class test_webhook_task(ViewTestCase):
 
@@ -209,3 +268,143 @@ class test_task_is_successful(ViewTestCase):
 
     def test_retry(self):
         self.assertStatusForIs(states.RETRY, False, KeyError('foo'))
+
+
+class test_tasks_status(ViewTestCase):
+
+    def test_get(self):
+        done, pending = gen_unique_id(), gen_unique_id()
+        current_app.backend.store_result(done, 42, states.SUCCESS)
+        response = self.client.get(tasks_status(),
+                                   {'id': [done, pending]})
+        self.assertJSONEqual(response, {done: states.SUCCESS,
+                                        pending: states.PENDING})
+
+        # not modified until any of the states change.
+        response = self.client.get(tasks_status(), {'id': [done, pending]},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        current_app.backend.store_result(pending, 1, states.STARTED)
+        response = self.client.get(tasks_status(), {'id': [done, pending]},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_post(self):
+        done = gen_unique_id()
+        current_app.backend.store_result(done, 42, states.SUCCESS)
+        response = self.client.post(tasks_status(), {'id': [done]})
+        self.assertJSONEqual(response, {done: states.SUCCESS})
+        response = self.client.post(tasks_status(), '{"ids": ["%s"]}' % done,
+                                    content_type='application/json')
+        self.assertJSONEqual(response, {done: states.SUCCESS})
+        response = self.client.post(tasks_status(), '{"ids": 1}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_streaming(self):
+        ids = [gen_unique_id() for _ in range(5)]
+        prev = views.JSON_STREAM_THRESHOLD, views.JSON_STREAM_CHUNK_SIZE
+        views.JSON_STREAM_THRESHOLD, views.JSON_STREAM_CHUNK_SIZE = 3, 2
+        try:
+            response = self.client.get(tasks_status(), {'id': ids})
+        finally:
+            views.JSON_STREAM_THRESHOLD, views.JSON_STREAM_CHUNK_SIZE = prev
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['ETag'])
+        self.assertJSONEqual(b''.join(response.streaming_content),
+                             dict((i, states.PENDING) for i in ids))
+
+
+class test_task_wait(ViewTestCase):
+
+    def test_ready(self):
+        uuid = gen_unique_id()
+        current_app.backend.store_result(uuid, 42, states.SUCCESS)
+        response = self.client.get(task_wait(task_id=uuid))
+        self.assertJSONEqual(response, {'task': {
+            'id': uuid, 'status': states.SUCCESS, 'result': 42,
+        }})
+
+    def test_timeout(self):
+        uuid = gen_unique_id()
+        response = self.client.get(task_wait(task_id=uuid),
+                                   {'timeout': '0.1'})
+        self.assertJSONEqual(response, {'task': {
+            'id': uuid, 'status': states.PENDING, 'result': None,
+        }})
+        response = self.client.get(task_wait(task_id=uuid),
+                                   {'timeout': 'never'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_events(self):
+        done, pending = gen_unique_id(), gen_unique_id()
+        current_app.backend.store_result(done, 42, states.SUCCESS)
+        response = self.client.get(
+            tasks_events(), {'id': [done, pending], 'timeout': '0.1'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = b''.join(response.streaming_content).decode('utf-8')
+        events = [
+            dict(line.split(': ', 1) for line in chunk.split('\n'))
+            for chunk in stream.split('\n\n')
+            if chunk and not chunk.startswith(':')
+        ]
+        self.assertEqual(events[-1]['event'], 'end')
+        self.assertEqual(
+            sorted(loads(e['data'])['id'] for e in events[:-1]),
+            sorted([done, pending]),
+        )
+
+
+class test_aio_views(ViewTestCase):
+
+    def setUp(self):
+        try:
+            from asgiref.sync import async_to_sync
+            from djcelery import aio_views
+            from djcelery.tests.aio_utils import collect
+        except (ImportError, SyntaxError):
+            raise unittest.SkipTest('asyncio support not available')
+        self.async_to_sync = async_to_sync
+        self.collect = collect
+        self.views = aio_views
+
+    def test_is_task_successful(self):
+        uuid = gen_unique_id()
+        current_app.backend.store_result(uuid, 42, states.SUCCESS)
+        request = RequestFactory().get('/')
+        response = self.async_to_sync(self.views.is_task_successful)(
+            request, uuid,
+        )
+        self.assertJSONEqual(response, {'task': {'id': uuid,
+                                                 'executed': True}})
+
+    def test_task_status(self):
+        uuid = gen_unique_id()
+        request = RequestFactory().get('/')
+        response = self.async_to_sync(self.views.task_status)(request, uuid)
+        self.assertJSONEqual(response, {'task': {
+            'id': uuid, 'status': states.PENDING, 'result': None,
+        }})
+
+    def test_tasks_events(self):
+        if not self.views.STREAMS_ASYNC:
+            raise unittest.SkipTest('async streaming needs Django 4.2+')
+        request = RequestFactory().get(
+            '/', {'id': [gen_unique_id()], 'timeout': '0.1'},
+        )
+        response = self.async_to_sync(self.views.tasks_events)(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+    def test_tasks_events_stream(self):
+        done, pending = gen_unique_id(), gen_unique_id()
+        current_app.backend.store_result(done, 42, states.SUCCESS)
+        chunks = self.async_to_sync(self.collect)(
+            self.views.tasks_events_stream([done, pending], 0.1),
+        )
+        self.assertEqual(chunks[-1], 'event: end\ndata: {}\n\n')
+        self.assertEqual(
+            sorted(loads(chunk.split('data: ', 1)[1])['id']
+                   for chunk in chunks[:-1] if chunk.startswith('event:')),
+            sorted([done, pending]),
+        )
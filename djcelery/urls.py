@@ -10,6 +10,18 @@ URLs defined for celery.
 
     URL  to :func:`~celery.views.task_status`.
 
+* ``/$task_id/wait/?timeout=$seconds``
+
+    URL to :func:`~celery.views.task_wait`.
+
+* ``/status/?id=$task_id&id=...``
+
+    URL to :func:`~celery.views.tasks_status`.
+
+* ``/events/?id=$task_id&id=...&timeout=$seconds``
+
+    URL to :func:`~celery.views.tasks_events`.
+
 """
 from __future__ import absolute_import, unicode_literals
 
@@ -32,6 +44,21 @@ urlpatterns = [
         views.task_status,
         name='celery-task_status'
     ),
+    url(
+        r'^%s/wait/?$' % task_pattern,
+        views.task_wait,
+        name='celery-task_wait'
+    ),
+    url(
+        r'^status/?$',
+        views.tasks_status,
+        name='celery-tasks_status'
+    ),
+    url(
+        r'^events/?$',
+        views.tasks_events,
+        name='celery-tasks_events'
+    ),
     url(
         r'^tasks/?$',
         views.registered_tasks,
@@ -1,24 +1,135 @@
 from __future__ import absolute_import, unicode_literals
 
+from collections import namedtuple
 from functools import wraps
-
-from django.http import HttpResponse, Http404
-
-from json import dumps
+from hashlib import md5
+from time import time
+
+from django.conf import settings
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, Http404,
+    StreamingHttpResponse,
+)
+from django.utils.http import (
+    http_date, parse_etags, parse_http_date_safe, quote_etag,
+)
+from django.views.decorators.csrf import csrf_exempt
+
+from json import dumps, loads
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # noqa
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None  # noqa
 
 from celery import states
-from celery.five import keys, items
+from celery.five import keys, items, monotonic, string_t
 from celery.registry import tasks
 from celery.result import AsyncResult
 from celery.utils import get_full_cls_name
 from celery.utils.encoding import safe_repr
 
+from .backends.notify import PollingListener
+
 # Ensure built-in tasks are loaded for task_list view
 import celery.task  # noqa
 
+#: Maximum number of task ids accepted by :func:`tasks_status`.
+TASKS_STATUS_MAX_IDS = 1000
+
+#: Default and maximum number of seconds :func:`task_wait` and
+#: :func:`tasks_events` hold a request open.
+TASK_WAIT_TIMEOUT = 30.0
+TASK_WAIT_MAX_TIMEOUT = 300.0
+
+#: Seconds between the lookups of :func:`watch_tasks`, if the result
+#: backend cannot notify about stored results.
+TASK_WATCH_INTERVAL = 1.0
+
+#: Maximum ``limit`` of a :func:`registered_tasks` page.
+REGISTERED_TASKS_MAX_LIMIT = 1000
+
+#: JSON objects with more entries than this are streamed by
+#: :func:`conditional_json_response`, in chunks of this many entries.
+JSON_STREAM_THRESHOLD = 500
+JSON_STREAM_CHUNK_SIZE = 100
+
+
+def _orjson_dumps(obj, sort_keys=False):
+    option = orjson.OPT_SORT_KEYS if sort_keys else 0
+    return orjson.dumps(obj, option=option).decode('utf-8')
+
+
+def _ujson_dumps(obj, sort_keys=False):
+    return ujson.dumps(obj, sort_keys=sort_keys)
+
+
+#: Available JSON encoders by name.
+JSON_ENCODERS = {'json': dumps}
+if orjson is not None:
+    JSON_ENCODERS['orjson'] = _orjson_dumps
+if ujson is not None:
+    JSON_ENCODERS['ujson'] = _ujson_dumps
+
+_json_encoder = None
+
+
+def get_json_encoder():
+    """Returns the JSON encoder named by the ``CELERY_JSON_ENCODER``
+    setting, or by default the fastest one installed of ``orjson``,
+    ``ujson`` and ``json``."""
+    global _json_encoder
+    if _json_encoder is None:
+        name = getattr(settings, 'CELERY_JSON_ENCODER', None)
+        if name is None:
+            name = next(n for n in ('orjson', 'ujson', 'json')
+                        if n in JSON_ENCODERS)
+        try:
+            _json_encoder = JSON_ENCODERS[name]
+        except KeyError:
+            raise ValueError(
+                'CELERY_JSON_ENCODER: {0!r} is not installed'.format(name))
+    return _json_encoder
+
+
+def json_dumps(obj, sort_keys=False):
+    """Encode ``obj`` as JSON, using :func:`get_json_encoder`.
+
+    Falls back to :func:`json.dumps` for values the encoder does not
+    support, so the output does not depend on the encoder used.
+
+    """
+    try:
+        return get_json_encoder()(obj, sort_keys=sort_keys)
+    except (TypeError, ValueError, OverflowError):
+        return dumps(obj, sort_keys=sort_keys)
+
 
 def JsonResponse(response):
-    return HttpResponse(dumps(response), content_type='application/json')
+    return HttpResponse(json_dumps(response), content_type='application/json')
+
+
+def StreamingJsonResponse(mapping, chunk_size=None):
+    """Stream the JSON object ``mapping`` in chunks of ``chunk_size``
+    entries, sorted by key."""
+    return StreamingHttpResponse(
+        iterencode_object(mapping, chunk_size or JSON_STREAM_CHUNK_SIZE),
+        content_type='application/json',
+    )
+
+
+def iterencode_object(mapping, chunk_size=JSON_STREAM_CHUNK_SIZE):
+    pairs = sorted(items(mapping))
+    yield '{'
+    for i in range(0, len(pairs), chunk_size):
+        chunk = json_dumps(dict(pairs[i:i + chunk_size]), sort_keys=True)
+        yield (',' if i else '') + chunk[1:-1]
+    yield '}'
 
 
 def task_view(task):
@@ -59,14 +170,26 @@ def apply(request, task_name):
 
 def is_task_successful(request, task_id):
     """Returns task execute status in JSON format."""
-    return JsonResponse({'task': {
+    # only the state is needed, so avoid fetching the whole result.
+    backend = AsyncResult(task_id).backend
+    return JsonResponse(
+        task_successful_data(task_id, backend.get_state(task_id)),
+    )
+
+
+def task_successful_data(task_id, state):
+    return {'task': {
         'id': task_id,
-        'executed': AsyncResult(task_id).successful(),
-    }})
+        'executed': state == states.SUCCESS,
+    }}
 
 
 def task_status(request, task_id):
     """Returns task status and result in JSON format."""
+    return JsonResponse(task_status_data(task_id))
+
+
+def task_status_data(task_id):
     result = AsyncResult(task_id)
     state, retval = result.state, result.result
     response_data = {'id': task_id, 'status': state, 'result': retval}
@@ -75,12 +198,288 @@ def task_status(request, task_id):
         response_data.update({'result': safe_repr(retval),
                               'exc': get_full_cls_name(retval.__class__),
                               'traceback': traceback})
-    return JsonResponse({'task': response_data})
+    return {'task': response_data}
+
+
+@csrf_exempt
+def tasks_status(request):
+    """Returns the status of many tasks as a JSON object mapping
+    task ids to states.
+
+    The task ids are given as repeated ``id`` query or form parameters,
+    or as the ``ids`` list of a JSON request body.  Responses include an
+    ``ETag``, so pollers sending ``If-None-Match`` get an empty
+    ``304 Not Modified`` response until any of the states change.
+
+    """
+    try:
+        task_ids = tasks_status_ids(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    return conditional_json_response(request, tasks_status_data(task_ids))
+
+
+def tasks_status_ids(request):
+    """Returns the task ids requested from :func:`tasks_status`,
+    raises :exc:`ValueError` if they are invalid."""
+    if request.method == 'POST' and \
+            request.META.get('CONTENT_TYPE', '').startswith(
+                'application/json'):
+        try:
+            task_ids = loads(request.body.decode('utf-8'))['ids']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError('tasks_status: expected {"ids": [...]}')
+        if not isinstance(task_ids, list) or \
+                not all(isinstance(t, string_t) for t in task_ids):
+            raise ValueError('tasks_status: ids must be a list of strings')
+    else:
+        params = request.POST if request.method == 'POST' else request.GET
+        task_ids = params.getlist('id')
+    if len(task_ids) > TASKS_STATUS_MAX_IDS:
+        raise ValueError('tasks_status: at most {0} ids allowed'.format(
+            TASKS_STATUS_MAX_IDS))
+    return task_ids
+
+
+def tasks_status_data(task_ids):
+    if not task_ids:
+        return {}
+    backend = AsyncResult(task_ids[0]).backend
+    get_states = getattr(backend, 'get_states', None)
+    if get_states is not None:
+        return get_states(task_ids)
+    return {task_id: backend.get_state(task_id) for task_id in task_ids}
+
+
+def conditional_json_response(request, data):
+    """Returns ``data``, a mapping of strings to strings, as a JSON
+    object with an ``ETag``, or an empty ``304 Not Modified`` response
+    if the request has a matching ``If-None-Match`` header.
+
+    The ``ETag`` is computed from ``data`` rather than from the encoded
+    response, so that large objects can be streamed, see
+    :data:`JSON_STREAM_THRESHOLD`.
+
+    """
+    digest = md5()
+    for key, value in sorted(items(data)):
+        digest.update('{0}\0{1}\n'.format(key, value).encode('utf-8'))
+    etag = quote_etag(digest.hexdigest())
+    if not_modified(request, etag):
+        response = HttpResponseNotModified()
+    elif len(data) > JSON_STREAM_THRESHOLD:
+        response = StreamingJsonResponse(data)
+    else:
+        response = HttpResponse(json_dumps(data, sort_keys=True),
+                                content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """Returns true if the request has an ``If-None-Match`` header
+    matching ``etag``, or else an ``If-Modified-Since`` header not before
+    ``last_modified`` (in seconds since the epoch)."""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '').strip()
+    if if_none_match:
+        return if_none_match == '*' or etag in parse_etags(if_none_match)
+    if last_modified is not None:
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''),
+        )
+        return since is not None and int(last_modified) <= since
+    return False
+
+
+def task_wait(request, task_id):
+    """Long-polling version of :func:`task_status`.
+
+    Returns the task status and result in JSON format as soon as the
+    task is ready, or its current status after the number of seconds
+    given by the ``timeout`` query parameter.
+
+    """
+    try:
+        timeout = task_wait_timeout(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    wait_for_tasks([task_id], timeout)
+    return JsonResponse(task_status_data(task_id))
+
+
+@csrf_exempt
+def tasks_events(request):
+    """Stream the states of many tasks as server-sent events.
+
+    The tasks are given like for :func:`tasks_status`.  A ``status``
+    event with a ``{"id": task_id, "status": state}`` object is sent
+    whenever the state of a task changes, and an ``end`` event when
+    all of the tasks are ready or after ``timeout`` seconds.
+
+    """
+    try:
+        task_ids = tasks_status_ids(request)
+        timeout = task_wait_timeout(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    response = StreamingHttpResponse(
+        tasks_events_stream(task_ids, timeout),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer events.
+    return response
+
+
+def tasks_events_stream(task_ids, timeout):
+    for change in watch_tasks(task_ids, timeout):
+        yield task_event(change)
+    yield 'event: end\ndata: {}\n\n'
+
+
+def task_event(change):
+    """Format a change yielded by :func:`watch_tasks` as an event."""
+    if change is None:
+        # keep-alive comment, also detects disconnected clients.
+        return ': waiting\n\n'
+    return 'event: status\ndata: {0}\n\n'.format(json_dumps({
+        'id': change[0], 'status': change[1],
+    }))
+
+
+def task_wait_timeout(request):
+    try:
+        timeout = float(request.GET.get('timeout', TASK_WAIT_TIMEOUT))
+    except ValueError:
+        raise ValueError('timeout must be a number')
+    return max(min(timeout, TASK_WAIT_MAX_TIMEOUT), 0)
+
+
+def wait_for_tasks(task_ids, timeout):
+    """Wait until all of the tasks are ready, or ``timeout`` seconds
+    passed, see :func:`watch_tasks`."""
+    for _ in watch_tasks(task_ids, timeout):
+        pass
+
+
+def watch_tasks(task_ids, timeout, interval=TASK_WATCH_INTERVAL):
+    """Watch the states of many tasks using a single lookup per iteration.
+
+    Yields ``(task_id, state)`` tuples for every state change, and
+    :const:`None` for iterations without any, until all of the tasks
+    are ready or ``timeout`` seconds passed.
+
+    Waits for notifications between lookups if the result backend
+    supports them, see :meth:`DatabaseBackend.wait_for_notification
+    <djcelery.backends.database.DatabaseBackend.wait_for_notification>`.
+
+    """
+    if not task_ids:
+        return
+    backend = AsyncResult(task_ids[0]).backend
+    notifies = hasattr(backend, 'wait_for_notification')
+    if notifies:
+        listener = backend.listener()
+    else:
+        listener = PollingListener()
+    remaining, seen = set(task_ids), {}
+    deadline = monotonic() + timeout
+    with listener:
+        if notifies:
+            interval = backend.listener_interval(listener, interval)
+        while remaining:
+            changed = False
+            for task_id, state in items(tasks_status_data(list(remaining))):
+                if seen.get(task_id) != state:
+                    seen[task_id] = state
+                    changed = True
+                    yield task_id, state
+                if state in states.READY_STATES:
+                    remaining.discard(task_id)
+            left = deadline - monotonic()
+            if not remaining or left <= 0:
+                break
+            if not changed:
+                yield None
+            if notifies:
+                backend.wait_for_notification(
+                    listener, remaining, min(interval, left),
+                )
+            else:
+                listener.wait(remaining, min(interval, left))
 
 
 def registered_tasks(request):
-    """View returning all defined tasks as a JSON object."""
-    return JsonResponse({'regular': list(keys(tasks)), 'periodic': ''})
+    """View returning all defined tasks as a JSON object.
+
+    The task names can be filtered using the ``q`` query parameter,
+    matching a part of the name regardless of case, and paginated
+    using the ``offset`` and ``limit`` query parameters.  The number of
+    matching tasks is then included as ``count``.
+
+    Responses include ``ETag`` and ``Last-Modified`` headers, so
+    conditional requests get an empty ``304 Not Modified`` response
+    until the task registry changes.
+
+    """
+    cached = get_registered_tasks()
+    params = request.GET
+    if any(param in params for param in ('q', 'offset', 'limit')):
+        try:
+            offset = int(params.get('offset') or 0)
+            limit = int(params.get('limit') or REGISTERED_TASKS_MAX_LIMIT)
+        except ValueError:
+            return HttpResponseBadRequest('offset and limit must be numbers')
+        if offset < 0 or limit < 0:
+            return HttpResponseBadRequest('offset and limit must be positive')
+        limit = min(limit, REGISTERED_TASKS_MAX_LIMIT)
+        names = cached.names
+        search = params.get('q', '').lower()
+        if search:
+            names = [name for name in names if search in name.lower()]
+        body = json_dumps({'regular': list(names[offset:offset + limit]),
+                           'periodic': '',
+                           'count': len(names)}).encode('utf-8')
+        etag = quote_etag(md5(body).hexdigest())
+    else:
+        body, etag = cached.body, cached.etag
+    if not_modified(request, etag, cached.last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(cached.last_modified)
+    return response
+
+
+#: Encoded :func:`registered_tasks` response for a registry version.
+RegisteredTasks = namedtuple('RegisteredTasks', (
+    'version', 'names', 'body', 'etag', 'last_modified',
+))
+
+_registered_tasks = None
+
+
+def get_registered_tasks():
+    """Returns the :class:`RegisteredTasks` response, which is
+    encoded once per version of the task registry.
+
+    The version is the set of registered task names, only sorted and
+    encoded again when tasks are registered or unregistered.
+
+    """
+    global _registered_tasks
+    version = frozenset(keys(tasks))
+    cached = _registered_tasks
+    if cached is None or cached.version != version:
+        names = tuple(sorted(keys(tasks)))
+        body = json_dumps({'regular': list(names),
+                           'periodic': ''}).encode('utf-8')
+        cached = _registered_tasks = RegisteredTasks(
+            version, names, body, quote_etag(md5(body).hexdigest()),
+            int(time()),
+        )
+    return cached
 
 
 def task_webhook(fun):